@@ -0,0 +1,353 @@
+"""
+API load test
+    seeds a question bank of --questions rows into --database (a
+    throwaway SQLite file by default) and drives every endpoint of
+    create_app, first through the Flask test client and then through a
+    threaded WSGI server with --concurrency parallel clients. Reports
+    p50/p95/p99 latency, throughput, and the resident memory of the
+    process after each endpoint plus how much that endpoint added.
+
+    The response cache is off, so GET endpoints run their views on
+    every request. Pass --response-cache-ttl to measure cache hits
+    instead.
+
+    Run from the backend directory:
+        python -m benchmarks.api --questions 100000 --output before.json
+        python -m benchmarks.api --questions 100000 \\
+            --compare before.json --threshold 0.2
+
+    With --compare the run exits with status 1 when the --metric of an
+    endpoint got worse than the baseline by more than --threshold (a
+    fraction) and --min-delta-ms. An existing --database is only seeded
+    if its questions table is empty, unless --reseed is given, which
+    deletes every question first. The write scenarios add and delete
+    questions, so a second run against the same --database needs
+    --reseed.
+"""
+import argparse
+import http.client
+import itertools
+import json
+import logging
+import os
+import resource
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from sqlalchemy import func
+from werkzeug.serving import make_server
+
+from models import db, Question, Category
+from flaskr import create_app
+
+CATEGORY_TYPES = ['Science', 'Art', 'Geography', 'History',
+                  'Entertainment', 'Sports']
+SEED_BATCH_SIZE = 10000
+METRICS = ('p50_ms', 'p95_ms', 'p99_ms', 'throughput')
+
+
+def seed(count, reseed=False):
+    if reseed:
+        db.session.query(Question).delete()
+    existing = db.session.query(func.count(Question.id)).scalar()
+    if existing == count:
+        return
+    if existing:
+        raise SystemExit(f'the database already holds {existing} questions, '
+                         f'pass --reseed to replace them, e.g. after the '
+                         f'write scenarios of an earlier run')
+    if not db.session.query(Category).count():
+        db.session.add_all(Category(type) for type in CATEGORY_TYPES)
+        db.session.flush()
+    category_ids = [category.id for category in db.session.query(Category)]
+
+    for start in range(0, count, SEED_BATCH_SIZE):
+        db.session.execute(Question.__table__.insert(), [{
+            'question': f'What is the title of benchmark question {number}?',
+            'answer': f'Answer {number}',
+            'category': category_ids[number % len(category_ids)],
+            'difficulty': 1 + number % 5
+        } for number in range(start, min(start + SEED_BATCH_SIZE, count))])
+    db.session.commit()
+
+
+"""
+Scenarios
+    one (name, method, request) entry per endpoint, where request(i)
+    returns the path and JSON body of the i-th request. Write scenarios
+    draw fresh ids, so both transports can run them back to back.
+"""
+
+
+def scenarios(app, question_count):
+    with app.app_context():
+        max_id = db.session.query(func.max(Question.id)).scalar()
+        category_id = db.session.query(func.min(Category.id)).scalar()
+    deletable_ids = itertools.count(max_id, -1)
+    middle_page = max(question_count // 20, 1)
+    quiz_category = {'type': 'Science', 'id': category_id}
+
+    def new_quiz_session():
+        response = app.test_client().post(
+            '/api/v1/quizzes/sessions', json={'quiz_category': quiz_category})
+        return response.get_json()['session_id']
+
+    def new_question(i):
+        return {'question': f'Benchmark question {i}?', 'answer': 'Yes',
+                'category': category_id, 'difficulty': 1}
+
+    return [
+        ('categories', 'GET', lambda i: ('/api/v1/categories', None)),
+        ('questions_first_page', 'GET',
+         lambda i: ('/api/v1/questions?page=1', None)),
+        ('questions_middle_page', 'GET',
+         lambda i: (f'/api/v1/questions?page={middle_page}', None)),
+        ('questions_after_id', 'GET',
+         lambda i: (f'/api/v1/questions?after_id={max_id // 2}', None)),
+        ('questions_cursor', 'GET',
+         lambda i: ('/api/v1/questions?cursor=', None)),
+        ('category_questions', 'GET',
+         lambda i: (f'/api/v1/categories/{category_id}/questions', None)),
+        ('category_questions_cursor', 'GET',
+         lambda i: (f'/api/v1/categories/{category_id}/questions?cursor=',
+                    None)),
+        ('search', 'POST',
+         lambda i: ('/api/v1/questions', {'searchTerm': 'title'})),
+        ('search_answers', 'POST',
+         lambda i: ('/api/v1/questions',
+                    {'searchTerm': f'answer {i}', 'searchAnswers': True})),
+        ('suggest', 'GET',
+         lambda i: ('/api/v1/questions/suggest?q=ti', None)),
+        ('quiz', 'POST',
+         lambda i: ('/api/v1/quizzes', {'previous_questions': [],
+                                        'quiz_category': quiz_category})),
+        ('quiz_batch', 'POST',
+         lambda i: ('/api/v1/quizzes', {'previous_questions': [],
+                                        'quiz_category': quiz_category,
+                                        'count': 5})),
+        ('quiz_session_create', 'POST',
+         lambda i: ('/api/v1/quizzes/sessions',
+                    {'quiz_category': quiz_category})),
+        ('quiz_session_next', 'POST',
+         lambda i: (f'/api/v1/quizzes/sessions/{new_quiz_session()}/next',
+                    None)),
+        ('export_category', 'GET',
+         lambda i: (f'/api/v1/questions/export?category={category_id}',
+                    None)),
+        ('create_question', 'POST',
+         lambda i: ('/api/v1/questions', new_question(i))),
+        ('bulk_import', 'POST',
+         lambda i: ('/api/v1/questions/bulk',
+                    [new_question(i * 100 + n) for n in range(100)])),
+        ('bulk_delete_dry_run', 'DELETE',
+         lambda i: ('/api/v1/questions', {'category': category_id,
+                                          'difficulty': 1,
+                                          'dry_run': True})),
+        ('delete_question', 'DELETE',
+         lambda i: (f'/api/v1/questions/{next(deletable_ids)}', None)),
+        ('statistics', 'GET', lambda i: ('/api/v1/stats', None)),
+    ]
+
+
+def rss_kib():
+    # Resident memory right now, or the peak so far where there is no /proc
+    try:
+        with open('/proc/self/statm') as statm:
+            pages = int(statm.read().split()[1])
+        return pages * resource.getpagesize() // 1024
+    except OSError:
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak // 1024 if sys.platform == 'darwin' else peak
+
+
+def percentile(ordered, fraction):
+    # Nearest-rank percentile of an ascending list
+    return ordered[max(int(len(ordered) * fraction + 0.5) - 1, 0)]
+
+
+def summarise(latencies, statuses, elapsed, rss_before):
+    ordered = sorted(latencies)
+    rss_after = rss_kib()
+    return {
+        'requests': len(ordered),
+        'errors': sum(1 for status in statuses if status >= 500),
+        'statuses': sorted(set(statuses)),
+        'p50_ms': round(percentile(ordered, 0.50) * 1000, 3),
+        'p95_ms': round(percentile(ordered, 0.95) * 1000, 3),
+        'p99_ms': round(percentile(ordered, 0.99) * 1000, 3),
+        'throughput': round(len(ordered) / elapsed, 1),
+        'rss_kib': rss_after,
+        'rss_growth_kib': rss_after - rss_before
+    }
+
+
+def run_test_client(app, method, request, count):
+    client = app.test_client()
+
+    def send(i):
+        path, body = request(i)
+        started = time.perf_counter()
+        response = client.open(path, method=method, json=body)
+        response.get_data()
+        return time.perf_counter() - started, response.status_code
+
+    rss_before = rss_kib()
+    send(-1)
+    started = time.perf_counter()
+    results = [send(i) for i in range(count)]
+    elapsed = time.perf_counter() - started
+    return summarise(*zip(*results), elapsed, rss_before)
+
+
+def run_wsgi_server(server, method, request, count, concurrency):
+    host, port = server.server_address[:2]
+
+    def send(i):
+        path, body = request(i)
+        headers, payload = {}, None
+        if body is not None:
+            headers['Content-Type'] = 'application/json'
+            payload = json.dumps(body)
+        started = time.perf_counter()
+        connection = http.client.HTTPConnection(host, port, timeout=60)
+        try:
+            connection.request(method, path, body=payload, headers=headers)
+            response = connection.getresponse()
+            response.read()
+        finally:
+            connection.close()
+        return time.perf_counter() - started, response.status
+
+    rss_before = rss_kib()
+    send(-1)
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        results = list(pool.map(send, range(count)))
+    elapsed = time.perf_counter() - started
+    return summarise(*zip(*results), elapsed, rss_before)
+
+
+def print_results(mode, results):
+    print(f'\n{mode}')
+    print(f'{"endpoint":>26} {"p50 ms":>9} {"p95 ms":>9} {"p99 ms":>9} '
+          f'{"req/s":>9} {"errors":>6} {"RSS MiB":>8} {"+RSS MiB":>8}')
+    for name, result in results.items():
+        print(f'{name:>26} {result["p50_ms"]:9.2f} {result["p95_ms"]:9.2f} '
+              f'{result["p99_ms"]:9.2f} {result["throughput"]:9.1f} '
+              f'{result["errors"]:6d} {result["rss_kib"] / 1024:8.1f} '
+              f'{result["rss_growth_kib"] / 1024:8.1f}')
+
+
+"""
+compare(baseline, current, metric, threshold, min_delta_ms)
+    lists the endpoints whose metric regressed: latencies that grew, or
+    throughput that dropped, by more than threshold (a fraction) and,
+    for latencies, by more than min_delta_ms
+"""
+
+
+def compare(baseline, current, metric, threshold, min_delta_ms):
+    regressions = []
+    for mode, results in current['results'].items():
+        for name, result in results.items():
+            before = baseline['results'].get(mode, {}).get(name)
+            if before is None or not before[metric]:
+                continue
+            after = result[metric]
+            if metric == 'throughput':
+                regressed = after < before[metric] * (1 - threshold)
+            else:
+                regressed = (after > before[metric] * (1 + threshold)
+                             and after - before[metric] > min_delta_ms)
+            if regressed:
+                regressions.append(
+                    f'{mode} {name}: {metric} {before[metric]} -> {after}')
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--database', help='SQLAlchemy URL to seed and '
+                        'test against, a temporary SQLite file by default')
+    parser.add_argument('--questions', type=int, default=1000)
+    parser.add_argument('--reseed', action='store_true')
+    parser.add_argument('--requests', type=int, default=200,
+                        help='requests per endpoint and transport')
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--response-cache-ttl', type=int, default=0,
+                        help='seconds GET responses are cached, 0 (the '
+                        'default) benchmarks the uncached views')
+    parser.add_argument('--mode', choices=['client', 'server', 'both'],
+                        default='both')
+    parser.add_argument('--endpoint', action='append',
+                        help='only run the named endpoints')
+    parser.add_argument('--output', help='write the results as JSON')
+    parser.add_argument('--compare', help='baseline results JSON')
+    parser.add_argument('--metric', choices=METRICS, default='p95_ms')
+    parser.add_argument('--threshold', type=float, default=0.2)
+    parser.add_argument('--min-delta-ms', type=float, default=1.0)
+    args = parser.parse_args(argv)
+
+    database = args.database
+    if database is None:
+        handle, path = tempfile.mkstemp(suffix='.db')
+        os.close(handle)
+        database = f'sqlite:///{path}'
+        try:
+            return run(args, database)
+        finally:
+            os.remove(path)
+    return run(args, database)
+
+
+def run(args, database):
+    app = create_app({'DATABASE_PATH': database,
+                      'RESPONSE_CACHE_TTL': args.response_cache_ttl})
+    with app.app_context():
+        started = time.perf_counter()
+        seed(args.questions, reseed=args.reseed)
+        print(f'{args.questions} questions in {database}, seeded in '
+              f'{time.perf_counter() - started:.1f}s, '
+              f'{args.requests} requests per endpoint')
+    selected = [scenario for scenario in scenarios(app, args.questions)
+                if not args.endpoint or scenario[0] in args.endpoint]
+
+    report = {'questions': args.questions, 'requests': args.requests,
+              'concurrency': args.concurrency,
+              'response_cache_ttl': args.response_cache_ttl, 'results': {}}
+    if args.mode in ('client', 'both'):
+        results = {name: run_test_client(app, method, request, args.requests)
+                   for name, method, request in selected}
+        report['results']['test_client'] = results
+        print_results('test_client', results)
+    if args.mode in ('server', 'both'):
+        logging.getLogger('werkzeug').setLevel(logging.ERROR)
+        server = make_server('127.0.0.1', 0, app, threaded=True)
+        thread = threading.Thread(target=server.serve_forever, daemon=True)
+        thread.start()
+        try:
+            results = {name: run_wsgi_server(server, method, request,
+                                             args.requests, args.concurrency)
+                       for name, method, request in selected}
+        finally:
+            server.shutdown()
+        report['results']['wsgi_server'] = results
+        print_results(f'wsgi_server, {args.concurrency} clients', results)
+
+    if args.output:
+        with open(args.output, 'w') as output:
+            json.dump(report, output, indent=2)
+    if args.compare:
+        with open(args.compare) as baseline:
+            regressions = compare(json.load(baseline), report, args.metric,
+                                  args.threshold, args.min_delta_ms)
+        for regression in regressions:
+            print(f'REGRESSION {regression}')
+        return 1 if regressions else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,82 @@
+"""
+Repository benchmark
+    times the TriviaRepository calls behind the read endpoints on their
+    own, inside an application context but without the request stack,
+    next to the same endpoint served through the Flask test client. The
+    difference is the HTTP, routing and serialisation overhead.
+
+    Run from the backend directory:
+        python -m benchmarks.repository --questions 100000
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+from models import db, Category, Question
+from flaskr import create_app
+from flaskr.cache import LRUCacheBackend
+from .api import seed
+
+
+def cases(repository, category_id):
+    return [
+        ('categories', repository.categories, '/api/v1/categories'),
+        ('question_page', lambda: repository.question_page(page=1),
+         '/api/v1/questions?page=1'),
+        ('category_questions',
+         lambda: repository.category_questions(category_id),
+         f'/api/v1/categories/{category_id}/questions'),
+        ('search', lambda: repository.search_questions('title'), None),
+        ('suggest', lambda: repository.suggest('ti'),
+         '/api/v1/questions/suggest?q=ti'),
+        ('next_quiz_question',
+         lambda: repository.next_quiz_question(set(), category_id), None),
+    ]
+
+
+def best_of(call, repeat):
+    call()
+    best = float('inf')
+    for _ in range(repeat):
+        started = time.perf_counter()
+        call()
+        best = min(best, time.perf_counter() - started)
+    return best * 1000
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--questions', type=int, default=10000)
+    parser.add_argument('--repeat', type=int, default=50)
+    args = parser.parse_args(argv)
+
+    handle, path = tempfile.mkstemp(suffix='.db')
+    os.close(handle)
+    try:
+        # A zero-sized response cache, so endpoints run their view
+        app = create_app({
+            'DATABASE_PATH': f'sqlite:///{path}',
+            'RESPONSE_CACHE_BACKEND': LRUCacheBackend(max_entries=0)})
+        repository = app.extensions['trivia_repository']
+        client = app.test_client()
+        with app.app_context():
+            seed(args.questions)
+            category_id = db.session.query(Category.id).first().id
+            print(f'{db.session.query(Question).count()} questions, '
+                  f'best of {args.repeat}')
+            print(f'{"call":>20} {"repository ms":>14} {"endpoint ms":>12}')
+            for name, call, endpoint in cases(repository, category_id):
+                direct = best_of(call, args.repeat)
+                served = '-'
+                if endpoint:
+                    served = '%.3f' % best_of(lambda: client.get(endpoint),
+                                              args.repeat)
+                print(f'{name:>20} {direct:14.3f} {served:>12}')
+    finally:
+        os.remove(path)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,89 @@
+"""
+Serialisation benchmark
+    times rendering one response of N questions three ways, from an
+    in-memory SQLite database seeded with N rows:
+
+    - orm_jsonify: ORM entities, Question.format() dicts, flask.jsonify
+    - orm_provider: the same dicts through json_response
+    - core_fast_path: Core column rows through encode_questions
+
+    Run from the backend directory:
+        python -m benchmarks.serialization --questions 10000
+"""
+import argparse
+import sys
+import time
+
+from flask import Flask, jsonify
+
+from models import db, setup_db, Question
+from flaskr.serialization import (
+    QUESTION_COLUMNS,
+    default_provider,
+    encode_questions,
+    json_response
+)
+
+
+def seed(count):
+    db.session.execute(Question.__table__.insert(), [{
+        'question': f'What is the answer to benchmark question {number}?',
+        'answer': f'Answer "{number}"',
+        'category': 1 + number % 6,
+        'difficulty': 1 + number % 5
+    } for number in range(count)])
+    db.session.commit()
+
+
+def orm_jsonify():
+    questions = db.session.query(Question).all()
+    response = jsonify({'questions': [q.format() for q in questions]})
+    db.session.expunge_all()
+    return response
+
+
+def orm_provider():
+    questions = db.session.query(Question).all()
+    response = json_response({'questions': [q.format() for q in questions]})
+    db.session.expunge_all()
+    return response
+
+
+def core_fast_path():
+    columns = [getattr(Question, column) for column in QUESTION_COLUMNS]
+    rows = db.session.query(*columns).all()
+    return json_response({'questions': encode_questions(rows)})
+
+
+def measure(render, repeat):
+    best = float('inf')
+    for _ in range(repeat):
+        started = time.perf_counter()
+        size = len(render().get_data())
+        best = min(best, time.perf_counter() - started)
+    return best, size
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--questions', type=int, default=10000)
+    parser.add_argument('--repeat', type=int, default=10)
+    args = parser.parse_args(argv)
+
+    app = Flask(__name__)
+    setup_db(app, 'sqlite://', replica_paths=[])
+    with app.app_context():
+        seed(args.questions)
+        print(f'{args.questions} questions, JSON provider: '
+              f'{default_provider.name}, best of {args.repeat}')
+        baseline = None
+        for render in (orm_jsonify, orm_provider, core_fast_path):
+            seconds, size = measure(render, args.repeat)
+            baseline = baseline or seconds
+            print(f'{render.__name__:>15}: {seconds * 1000:8.2f} ms '
+                  f'{args.questions / seconds:12,.0f} questions/s '
+                  f'{size / 1024:8.0f} KiB  x{baseline / seconds:.1f}')
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,116 @@
+"""
+Question store benchmark
+    seeds --questions rows into a throwaway SQLite file and reports the
+    memory held by a ColumnarQuestionStore of them, per question and per
+    100k questions, next to the list of SQLAlchemy Rows a query returns.
+    Then times the repository reads with and without the store.
+
+    Run from the backend directory:
+        python -m benchmarks.store --questions 100000
+"""
+import argparse
+import gc
+import os
+import sys
+import tempfile
+import tracemalloc
+
+from models import db, Category
+from flaskr import create_app
+from flaskr.store import ColumnarQuestionStore
+from .api import seed
+from .repository import best_of
+
+
+def allocated(build):
+    # Bytes still allocated by what build() returns, and the result
+    gc.collect()
+    tracemalloc.start()
+    try:
+        result = build()
+        gc.collect()
+        return tracemalloc.get_traced_memory()[0], result
+    finally:
+        tracemalloc.stop()
+
+
+def store_of(rows):
+    store = ColumnarQuestionStore(None, None)
+    store.rebuild(rows)
+    return store
+
+
+def search_text_of(store):
+    with store.lock:
+        return store.haystack('question'), store.haystack('answer')
+
+
+def read_cases(repository, category_id):
+    return [
+        ('question_page', lambda: repository.question_page(page=50)),
+        ('question_cursor_page',
+         lambda: repository.question_cursor_page(after_id=500)),
+        ('category_questions',
+         lambda: repository.category_questions(category_id)),
+        ('load_question', lambda: repository.load_question(1)),
+        ('search', lambda: repository.search_questions('question 123')),
+        ('next_quiz_questions',
+         lambda: repository.next_quiz_questions(set(), 5, category_id)),
+    ]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--questions', type=int, default=100000)
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args(argv)
+
+    handle, path = tempfile.mkstemp(suffix='.db')
+    os.close(handle)
+    try:
+        database = {'DATABASE_PATH': f'sqlite:///{path}'}
+        app = create_app(database)
+        repository = app.extensions['trivia_repository']
+        with app.app_context():
+            seed(args.questions)
+
+            # Loaded inside each measurement, so the texts are counted
+            def load():
+                return repository.select_questions().order_by('id').all()
+
+            row_bytes, rows = allocated(load)
+            count = len(rows)
+            del rows
+            store_bytes, store = allocated(lambda: store_of(load()))
+        text_bytes, _ = allocated(lambda: search_text_of(store))
+        scale = 100000 / max(count, 1)
+
+        print(f'{count} questions')
+        print(f'{"held as":>24} {"bytes/question":>15} {"MiB/100k":>9}')
+        for name, size in (('rows', row_bytes),
+                           ('columnar store', store_bytes),
+                           ('  + search text', text_bytes)):
+            print(f'{name:>24} {size / max(count, 1):15.1f} '
+                  f'{size * scale / 2 ** 20:9.1f}')
+
+        stored_app = create_app(dict(database, QUESTION_STORE=True))
+        print(f'\n{"call":>24} {"database ms":>12} {"store ms":>9}')
+        with app.app_context():
+            category_id = db.session.query(Category.id).first().id
+            plain = read_cases(app.extensions['trivia_repository'],
+                               category_id)
+        with stored_app.app_context():
+            stored = read_cases(stored_app.extensions['trivia_repository'],
+                                category_id)
+        for (name, direct), (_, cached) in zip(plain, stored):
+            with app.app_context():
+                database_ms = best_of(direct, args.repeat)
+            with stored_app.app_context():
+                store_ms = best_of(cached, args.repeat)
+            print(f'{name:>24} {database_ms:12.3f} {store_ms:9.3f}')
+    finally:
+        os.remove(path)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
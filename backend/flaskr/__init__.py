@@ -3,20 +3,82 @@ from doctest import REPORT_NDIFF
 import json
 import os
 from urllib import response
-from flask import Flask, request, abort, jsonify
+from flask import (
+    Flask,
+    Response,
+    request,
+    abort,
+    stream_with_context
+)
 from flask_sqlalchemy import SQLAlchemy
 from flask_cors import CORS
-import random
 
-from models import db, setup_db, Question, Category
-
-QUESTIONS_PER_PAGE = 10
+from models import (
+    db,
+    database_path,
+    setup_db,
+    pool_statistics,
+    read_only,
+    use_replica
+)
+from settings import (
+    BULK_BATCH_SIZE,
+    CHANGE_CHANNEL,
+    CHANGE_CHANNEL_FILE,
+    CHANGE_CHANNEL_POLL_INTERVAL,
+    INSTRUMENTATION,
+    INSTRUMENTATION_FULL_TABLE_ROWS,
+    INSTRUMENTATION_REPEATED_QUERIES,
+    QUESTION_STORE,
+    RESPONSE_CACHE_TTL
+)
+from .batch import FILTER_COLUMNS
+from .cache import ResponseCache
+from .changes import change_channel
+from .cli import trivia_cli
+from .export import EXPORT_FORMATS
+from .ingest import read_json, read_ndjson, valid_question_format
+from .instrumentation import MetricsRegistry, instrument_app
+from .pagination import InvalidCursor, decode_cursor
+from .quiz import UnknownStrategy, quiz_count, quiz_strategy
+from .repository import TriviaRepository
+from .serialization import encode_questions, json_response
 
 
 def create_app(test_config=None):
     # create and configure the app
     app = Flask(__name__)
-    setup_db(app)
+    if test_config:
+        app.config.update(test_config)
+    setup_db(app, app.config.get('DATABASE_PATH', database_path))
+    app.cli.add_command(trivia_cli)
+
+    with app.app_context():
+        changes = change_channel(
+            app.config.get('CHANGE_CHANNEL', CHANGE_CHANNEL),
+            engine=db.engine,
+            path=app.config.get('CHANGE_CHANNEL_FILE', CHANGE_CHANNEL_FILE),
+            poll_interval=CHANGE_CHANNEL_POLL_INTERVAL)
+    repository = TriviaRepository(
+        db, quiz_sessions=app.config.get('QUIZ_SESSION_STORE'),
+        question_store=app.config.get('QUESTION_STORE', QUESTION_STORE),
+        changes=changes, context=app.app_context)
+    app.extensions['trivia_repository'] = repository
+    if repository.question_store is not None:
+        with app.app_context():
+            repository.question_store.build()
+    response_cache = ResponseCache(
+        app.config.get('RESPONSE_CACHE_BACKEND'),
+        ttl=app.config.get('RESPONSE_CACHE_TTL', RESPONSE_CACHE_TTL))
+    repository.subscribe(response_cache.bump)
+
+    # Opt-in request timing and SQL metrics
+    metrics = None
+    if app.config.get('INSTRUMENTATION', INSTRUMENTATION):
+        metrics = MetricsRegistry()
+        instrument_app(app, metrics,
+                       repeated_threshold=INSTRUMENTATION_REPEATED_QUERIES,
+                       full_table_rows=INSTRUMENTATION_FULL_TABLE_ROWS)
 
     """
     @DONE: Set up CORS. Allow '*' for origins.
@@ -27,6 +89,14 @@ def create_app(test_config=None):
     """
     @DONE: Use the after_request decorator to set Access-Control-Allow
     """
+    @app.before_first_request
+    def build_suggestions():
+        repository.suggestions.build()
+
+    @app.before_request
+    def apply_changes_of_other_workers():
+        repository.sync()
+
     @app.after_request
     def after_request(response):
         response.headers.add('Access-Control-Allow-Headers',
@@ -43,6 +113,8 @@ def create_app(test_config=None):
     """
 
     @app.route('/api/v1/categories', methods=['GET'])
+    @read_only
+    @response_cache.cached
     def retrieve_categories():
         # Handle request
         if request.method != 'GET':
@@ -50,9 +122,7 @@ def create_app(test_config=None):
 
         # Handle data
         try:
-            categories = db.session.query(Category).all()
-            formatted_categories = {
-                category.id: category.type for category in categories}
+            formatted_categories = repository.categories()
         except BaseException:
             abort(500)
 
@@ -61,7 +131,7 @@ def create_app(test_config=None):
             abort(404)
 
         # Handle response
-        return jsonify({
+        return json_response({
             'success': True,
             'status_code': 200,
             'categories': formatted_categories
@@ -79,20 +149,31 @@ def create_app(test_config=None):
     ten questions per page and pagination at the bottom
     of the screen for three pages.
     Clicking on the page numbers should update the questions.
+
+    Pagination runs in SQL: `?page=` uses LIMIT/OFFSET and `?after_id=`
+    uses keyset pagination on the id, so only one page of rows is loaded.
+    `?cursor=` (empty for the first page) switches to cursor mode, where
+    each response carries an opaque `next_cursor` for the following page.
     """
 
     @app.route('/api/v1/questions', methods=['GET'])
+    @read_only
+    @response_cache.cached
     def retrieve_questions():
         # Handle request
         if request.method != 'GET':
             abort(405)
+        try:
+            after_cursor = decode_cursor(request.args.get('cursor'))
+        except InvalidCursor:
+            abort(400)
 
         # Handle data
         try:
-            questions = db.session.query(Question).order_by(Question.id).all()
-            paginated_questions = paginate_questions(request, questions)
-            response = retrieve_categories()
-            data = json.loads(json.dumps(response.json))
+            paginated_questions, next_cursor = paginate_questions(
+                request, after_cursor)
+            total_questions = repository.total_questions()
+            categories = repository.categories()
         except BaseException:
             abort(500)
 
@@ -101,24 +182,53 @@ def create_app(test_config=None):
             abort(404)
 
         # Handle response
-        return jsonify({
+        return json_response({
             'success': True,
-            'questions': paginated_questions,
-            'total_questions': len(questions),
-            'categories': data.get('categories'),
+            'questions': encode_questions(paginated_questions),
+            'total_questions': total_questions,
+            'categories': categories,
             'current_category': 'Science',
+            'next_cursor': next_cursor
         })
 
-    def paginate_questions(request, questions):
+    def paginate_questions(request, after_cursor=None):
         # Implement pagination
+        if 'cursor' in request.args:
+            return repository.question_cursor_page(after_id=after_cursor)
         page = request.args.get('page', 1, type=int)
-        start = (page - 1) * QUESTIONS_PER_PAGE
-        end = start + QUESTIONS_PER_PAGE
+        after_id = request.args.get('after_id', None, type=int)
+        return repository.question_page(page=page, after_id=after_id), None
 
-        # Format data
-        formatted_questions = [question.format() for question in questions]
-        paginated_questions = formatted_questions[start:end]
-        return paginated_questions
+    """
+    Create a GET endpoint to export the whole question bank.
+    Rows are streamed from a server-side cursor as NDJSON (default) or
+    CSV, optionally limited to one `?category=` id.
+    """
+
+    @app.route('/api/v1/questions/export', methods=['GET'])
+    @read_only
+    def export_questions():
+        # Handle request
+        export_format = request.args.get('format', 'ndjson')
+        category_id = request.args.get('category', None, type=int)
+        if export_format not in EXPORT_FORMATS:
+            abort(400)
+        if category_id is None and 'category' in request.args:
+            abort(400)
+
+        # Verify valid category id
+        if category_id is not None and \
+                repository.category_type(category_id) is None:
+            abort(404)
+
+        # Handle response
+        encode, mimetype = EXPORT_FORMATS[export_format]
+        rows = repository.export_rows(category_id)
+        return Response(
+            stream_with_context(encode(rows)),
+            mimetype=mimetype,
+            headers={'Content-Disposition':
+                     f'attachment; filename=questions.{export_format}'})
 
     """
     @DONE:
@@ -135,22 +245,71 @@ def create_app(test_config=None):
         if request.method != 'DELETE':
             abort(405)
 
-            # Handle data
-        question = db.session.query(Question).get_or_404(question_id)
-
         # Persist resource data
         try:
-            db.session.delete(question)
-            db.session.commit()
+            question = repository.delete_question(question_id)
         except BaseException:
             abort(500)
 
+        # Verify resource data
+        if question is None:
+            abort(404)
+
             # Handle response
-        return jsonify({
+        return json_response({
             'success': True,
             'status_code': 200
         })
 
+    """
+    Create an endpoint to DELETE questions in bulk.
+    The body holds either a list of `ids` or a `category` and/or
+    `difficulty` filter. Matching rows are removed with set-based
+    DELETEs in a single transaction; with `dry_run` the endpoint only
+    reports the ids that would be removed.
+    """
+
+    @app.route('/api/v1/questions', methods=['DELETE'])
+    def delete_questions_in_bulk():
+        # Handle payload
+        try:
+            body = request.get_json()
+            question_ids = body.get('ids', None)
+            filters = {column: int(body[column])
+                       for column in FILTER_COLUMNS if column in body}
+            dry_run = bool(body.get('dry_run', False))
+        except BaseException:
+            abort(422)
+
+        # Validate request data, never delete the whole bank by omission:
+        # exactly one of ids and filters, ids a non-empty list of ints
+        if (question_ids is None) == (not filters):
+            abort(400)
+        if question_ids is not None:
+            if not isinstance(question_ids, list) or not question_ids or \
+                    not all(type(question_id) is int
+                            for question_id in question_ids):
+                abort(400)
+            question_ids = sorted(set(question_ids))
+
+        # Persist resource data
+        try:
+            result = repository.delete_questions(
+                question_ids, filters, dry_run=dry_run,
+                batch_size=BULK_BATCH_SIZE)
+        except BaseException:
+            abort(500)
+
+        # Handle response
+        return json_response({
+            'success': True,
+            'status_code': 200,
+            'dry_run': dry_run,
+            'matched': result['matched'],
+            'deleted': result['deleted'],
+            'ids': result['ids']
+        })
+
     """
     @DONE:
     Create an endpoint to POST a new question,
@@ -172,10 +331,10 @@ def create_app(test_config=None):
         body = request.get_json()
         search_term = body.get('searchTerm', None)
         if search_term:
-            return retrieve_questions_by_search_term(search_term)
+            return retrieve_questions_by_search_term(search_term, body)
 
         # Validate request data
-        if valid_question_format(body):
+        if valid_question_format(body, repository.categories()):
             new_question = body.get('question', None)
             new_answer = body.get('answer', None)
             new_difficulty = body.get('difficulty', None)
@@ -183,37 +342,60 @@ def create_app(test_config=None):
         else:
             abort(400)
 
-        # Handle data
-        question_to_be_created = Question(
-            question=new_question,
-            answer=new_answer,
-            difficulty=new_difficulty,
-            category=new_category
-        )
-
         # Persist resource data
         try:
-            db.session.add(question_to_be_created)
-            db.session.commit()
+            repository.create_question(
+                question=new_question,
+                answer=new_answer,
+                difficulty=new_difficulty,
+                category=new_category
+            )
         except BaseException:
             abort(500)
 
         # Handle response
-        return jsonify({
+        return json_response({
             'success': True,
             'status_code': 200
         })
 
-    def valid_question_format(body):
-        # Verify all required keys are present
-        required_keys = ['question', 'answer', 'difficulty', 'category']
-        is_present = all(key in body for key in required_keys)
-        if not is_present:
-            return False
+    """
+    Create a POST endpoint to import questions in bulk.
+    The body is either a JSON array of questions or, with the
+    `application/x-ndjson` content type, one question per line.
+    Valid rows are inserted in batches of `?batch_size=` rows and
+    invalid or rejected rows are reported without aborting the import.
+    """
+
+    @app.route('/api/v1/questions/bulk', methods=['POST'])
+    def create_questions_in_bulk():
+        # Handle payload
+        batch_size = request.args.get(
+            'batch_size', BULK_BATCH_SIZE, type=int)
+        if batch_size < 1:
+            abort(400)
+        if request.mimetype == 'application/x-ndjson':
+            rows = read_ndjson(request.stream)
+        else:
+            try:
+                rows = read_json(request.get_json())
+            except BaseException:
+                abort(400)
+
+        # Persist resource data
+        try:
+            result = repository.import_questions(rows, batch_size=batch_size)
+        except BaseException:
+            abort(500)
 
-        # Verify all keys have non zero or empty values
-        has_values = all(body[key] for key in required_keys)
-        return True if has_values else False
+        # Handle response
+        return json_response({
+            'success': True,
+            'status_code': 200,
+            'inserted': result['inserted'],
+            'failed': len(result['errors']),
+            'errors': result['errors']
+        })
 
     """
     @DONE:
@@ -224,31 +406,63 @@ def create_app(test_config=None):
     TEST: Search by any phrase. The questions list will update to include
     only question that include that string within their question.
     Try using the word "title" to start.
+
+    Every word of the search term is matched as a word prefix, using
+    GIN-indexed full-text search on Postgres and an in-process inverted
+    index elsewhere. Results are ranked by relevance and paginated with
+    `page`; set `searchAnswers` to also match the answer text.
     """
 
-    def retrieve_questions_by_search_term(search_term):
+    def retrieve_questions_by_search_term(search_term, body):
+        use_replica()
+
+        # Handle payload
+        try:
+            page = int(body.get('page', request.args.get('page', 1)))
+            include_answers = bool(body.get('searchAnswers', False))
+        except BaseException:
+            abort(422)
+
         # Handle data
-        questions = (db.session
-                     .query(Question)
-                     .order_by(Question.id)
-                     .filter(Question.question.ilike(f'%{search_term}%'))
-                     .all())
+        try:
+            total_questions, questions = repository.search_questions(
+                search_term, include_answers=include_answers, page=page)
+        except BaseException:
+            abort(500)
 
         # Verify resource data
         if len(questions) == 0:
             abort(404)
 
-        # Format data
-        formatted_questions = [question.format() for question in questions]
-
         # Handle response
-        return jsonify({
+        return json_response({
             'success': True,
-            'questions': formatted_questions,
-            'total_questions': len(formatted_questions),
+            'questions': encode_questions(questions),
+            'total_questions': total_questions,
             'current_category': 'Entertainment'
         })
 
+    """
+    Create a GET endpoint for search-as-you-type suggestions.
+    It returns the question words starting with `q`, most used first,
+    from an in-memory prefix index that the create and delete
+    handlers keep up to date, so no database query is made.
+    """
+
+    @app.route('/api/v1/questions/suggest', methods=['GET'])
+    def suggest_question_terms():
+        # Handle request
+        prefix = request.args.get('q', '').strip()
+        limit = request.args.get('limit', 10, type=int)
+        if not prefix or limit < 1:
+            abort(400)
+
+        # Handle response
+        return json_response({
+            'success': True,
+            'suggestions': repository.suggest(prefix, limit=limit)
+        })
+
     """
     @DONE:
     Create a GET endpoint to get questions based on category.
@@ -256,45 +470,81 @@ def create_app(test_config=None):
     TEST: In the "List" tab / main screen, clicking on one of the
     categories in the left column will cause only questions of that
     category to be shown.
+
+    Questions are selected as plain column rows and rendered straight
+    to JSON with encode_questions, as a category can hold thousands.
+
+    Passing `?cursor=` returns one keyset page at a time together with
+    a `next_cursor`, instead of every question in the category.
     """
 
     @app.route('/api/v1/categories/<int:category_id>/questions',
                methods=['GET'])
+    @read_only
+    @response_cache.cached
     def retrieve_questions_by_category(category_id):
         # Handle request
         if request.method != 'GET':
             abort(405)
+        try:
+            after_cursor = decode_cursor(request.args.get('cursor'))
+        except InvalidCursor:
+            abort(400)
 
         # Verify valid category id
-        category = db.session.query(Category).get_or_404(category_id)
-        category_type = category.format()['type']
+        category_type = repository.category_type(category_id)
+        if category_type is None:
+            abort(404)
 
         # Handle data
+        next_cursor = None
         try:
-            questions_by_category = (
-                db.session
-                .query(Question)
-                .filter(Question.category == category_id)
-                .all()
-            )
-            formatted_questions_by_category = [
-                question.format()
-                for question in questions_by_category
-            ]
+            if 'cursor' in request.args:
+                (questions_by_category, next_cursor,
+                 total_questions_by_category) = \
+                    repository.category_cursor_page(
+                        category_id, after_id=after_cursor)
+            else:
+                questions_by_category = repository.category_questions(
+                    category_id)
+                total_questions_by_category = len(questions_by_category)
+            formatted_questions_by_category = encode_questions(
+                questions_by_category)
         except BaseException:
             abort(500)
 
             # Verify resource data
-        total_questions_by_category = len(formatted_questions_by_category)
-        if total_questions_by_category == 0:
+        if len(questions_by_category) == 0:
             abort(404)
 
             # Handle response
-        return jsonify({
+        return json_response({
             'success': True,
             'questions': formatted_questions_by_category,
             'total_questions': total_questions_by_category,
-            'current_category': category_type
+            'current_category': category_type,
+            'next_cursor': next_cursor
+        })
+
+    """
+    Create a GET endpoint for question bank statistics: the number of
+    questions in total, per category and difficulty, and per difficulty.
+    Counts come from the in-memory id index, so no table is scanned.
+    """
+
+    @app.route('/api/v1/stats', methods=['GET'])
+    def retrieve_statistics():
+        # Handle data
+        try:
+            statistics = repository.statistics()
+        except BaseException:
+            abort(500)
+
+        # Handle response
+        return json_response({
+            'success': True,
+            'status_code': 200,
+            **statistics
         })
 
     """
@@ -304,60 +554,144 @@ def create_app(test_config=None):
     and return a random question within the given category,
     if provided, and that is not one of the previous questions.
 
+    Candidates are drawn from an in-memory id index per category, so only
+    the chosen questions are loaded from the database, in one query. An
+    optional `count` (1 to MAX_QUIZ_COUNT) returns that many distinct
+    unseen questions under `questions` so clients can prefetch a round;
+    `question` stays the first of them. `strategy` picks
+    how: `uniform` (default), `ramp` to raise the difficulty as the quiz
+    goes on, or `weighted` with optional `difficulty_weights` and a list
+    of `mastered` question ids that come up less often.
+
     TEST: In the "Play" tab, after a user selects "All" or a category,
     one question at a time is displayed, the user is allowed to answer
     and shown whether they were correct or not.
     """
 
     @app.route('/api/v1/quizzes', methods=['POST'])
+    @read_only
     def quiz_question():
         # Handle payload
         try:
             body = request.get_json()
-            previous_questions = body.get('previous_questions', None)
+            previous_questions = set(body.get('previous_questions') or [])
             category = body.get('quiz_category')
             category_type = category['type']
+            category_id = None if category_type == 'click' else category['id']
+            strategy, options = quiz_strategy(body)
+            count = quiz_count(body)
+        except UnknownStrategy:
+            abort(400)
         except BaseException:
             abort(422)
 
+        # Verify valid category id
+        if category_id is not None and \
+                repository.category_type(category_id) is None:
+            abort(404)
+
         # Handle data
-        next_question = None
-        if category_type == 'click':
-            all_questions = db.session.query(Question).all()
+        next_questions = repository.next_quiz_questions(
+            previous_questions, count, category_id, strategy, options)
 
-            if len(previous_questions) != len(all_questions):
-                next_question = get_next_question(
-                    previous_questions, all_questions)
+        # Verify resource data
+        if any(question['id'] in previous_questions
+               for question in next_questions):
+            abort(500)
 
-                # Verify resource data
-                if next_question['id'] in previous_questions:
-                    abort(500)
-        else:
-            questions_by_category = (
-                db.session .query(Question) .filter(
-                    Question.category == category['id']) .all())
+        # Handle response
+        return json_response({
+            'success': True,
+            'question': next_questions[0] if next_questions else None,
+            'questions': next_questions
+        })
+
+    """
+    Quiz sessions keep the question ids already played on the server,
+    so clients no longer resend previous_questions on every step.
+    Create a session for a category, then ask it for the next question
+    until it returns null. Idle sessions expire after QUIZ_SESSION_TTL.
+    """
+
+    @app.route('/api/v1/quizzes/sessions', methods=['POST'])
+    @read_only
+    def create_quiz_session():
+        # Handle payload
+        try:
+            body = request.get_json()
+            category = body.get('quiz_category')
+            category_type = category['type']
+            category_id = None if category_type == 'click' else category['id']
+        except BaseException:
+            abort(422)
+
+        # Verify valid category id
+        if category_id is not None and \
+                repository.category_type(category_id) is None:
+            abort(404)
+
+        # Handle data
+        session_id, total_questions = repository.start_quiz_session(
+            category_id)
 
-            if len(previous_questions) != len(questions_by_category):
-                next_question = get_next_question(
-                    previous_questions, questions_by_category)
+        # Handle response
+        return json_response({
+            'success': True,
+            'status_code': 200,
+            'session_id': session_id,
+            'total_questions': total_questions
+        })
 
-                # Verify resource data
-                if next_question['id'] in previous_questions:
-                    abort(500)
+    @app.route('/api/v1/quizzes/sessions/<session_id>/next',
+               methods=['POST'])
+    @read_only
+    def next_quiz_session_question(session_id):
+        # Handle data
+        drawn = repository.next_session_question(session_id)
+
+        # Verify valid session id
+        if drawn is None:
+            abort(404)
 
         # Handle response
-        return jsonify({
+        next_question, remaining_questions = drawn
+        return json_response({
+            'success': True,
+            'question': next_question,
+            'remaining_questions': remaining_questions
+        })
+
+    """
+    Create a GET endpoint reporting connection pool usage of this
+    worker, to size DB_POOL_SIZE and DB_MAX_OVERFLOW per process.
+    Only served when INSTRUMENTATION is on.
+    """
+
+    @app.route('/api/v1/_pool', methods=['GET'])
+    def retrieve_pool_statistics():
+        if metrics is None:
+            abort(404)
+        return json_response({
             'success': True,
-            'question': next_question
+            'pool': pool_statistics(db.engine)
         })
 
-    def get_next_question(previous_questions, questions):
-        formatted_questions = [question.format() for question in questions]
-        next_questions = list(
-            filter(lambda q: q['id']
-                   not in previous_questions, formatted_questions)
-        )
-        return random.choice(next_questions)
+    """
+    Create a GET endpoint exposing the request and SQL metrics of this
+    worker, plus its pool statistics, in the Prometheus text format.
+    Only served when INSTRUMENTATION is on.
+    """
+
+    @app.route('/api/v1/_metrics', methods=['GET'])
+    def retrieve_metrics():
+        if metrics is None:
+            abort(404)
+        pools = {'primary': pool_statistics(db.engine)}
+        router = app.extensions.get('replicas')
+        for number, engine in enumerate(router.engines if router else ()):
+            pools[f'replica{number}'] = pool_statistics(engine)
+        return Response(metrics.render(pools),
+                        mimetype='text/plain; version=0.0.4')
 
     """
     @DONE:
@@ -369,7 +703,7 @@ def create_app(test_config=None):
 
     @app.errorhandler(400)
     def bad_request(error):
-        return jsonify({
+        return json_response({
             'success': False,
             'error': 400,
             'message': 'bad request'
@@ -377,7 +711,7 @@ def create_app(test_config=None):
 
     @app.errorhandler(404)
     def not_found(error):
-        return jsonify({
+        return json_response({
             'success': False,
             'error': 404,
             'message': 'requested resource not found'
@@ -385,7 +719,7 @@ def create_app(test_config=None):
 
     @app.errorhandler(405)
     def methhod_not_allowed(error):
-        return jsonify({
+        return json_response({
             'success': False,
             'error': 405,
             'message': 'method not allowed'
@@ -393,7 +727,7 @@ def create_app(test_config=None):
 
     @app.errorhandler(422)
     def unporcessable(error):
-        return jsonify({
+        return json_response({
             'success': False,
             'error': 422,
             'message': 'unprocessable entity'
@@ -401,7 +735,7 @@ def create_app(test_config=None):
 
     @app.errorhandler(500)
     def server_error(error):
-        return jsonify({
+        return json_response({
             'success': False,
             'error': 500,
             'message': 'internal server error'
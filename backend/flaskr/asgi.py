@@ -0,0 +1,69 @@
+import asyncio
+
+from settings import ASGI_THREADS
+from . import create_app
+
+try:
+    from asgiref.sync import ThreadSensitiveContext
+    from asgiref.wsgi import WsgiToAsgi
+except ImportError:
+    WsgiToAsgi = None
+
+"""
+AsgiFrontEnd
+    serves the Flask app of create_app to an ASGI server through
+    asgiref's WsgiToAsgi. This is an ASGI front end only: the views stay
+    synchronous and hold a thread while they wait on the database. On
+    its own WsgiToAsgi runs every request on one shared thread, so each
+    request gets a thread of its own, and at most threads of them run at
+    once; the others wait on the event loop, which costs no thread.
+"""
+
+
+class AsgiFrontEnd:
+
+    def __init__(self, app, threads=ASGI_THREADS):
+        if WsgiToAsgi is None:
+            raise RuntimeError('the ASGI mode needs asgiref installed')
+        self.app = app
+        self.wsgi = WsgiToAsgi(app)
+        self.threads = threads
+        # Created on the event loop of the first request
+        self.slots = None
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            await self.lifespan(receive, send)
+            return
+        if self.slots is None:
+            self.slots = asyncio.Semaphore(self.threads)
+        async with self.slots:
+            async with ThreadSensitiveContext():
+                await self.wsgi(scope, receive, send)
+
+    async def lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+
+"""
+create_asgi_app(config)
+    the API of create_app(config) as an ASGI app:
+
+        uvicorn --factory flaskr.asgi:create_asgi_app
+
+    Routes, views, caches and the write path are the Flask app's own.
+    ASGI_THREADS (config or environment) bounds the requests that run
+    at once.
+"""
+
+
+def create_asgi_app(config=None):
+    app = create_app(config)
+    return AsgiFrontEnd(app, threads=app.config.get('ASGI_THREADS',
+                                                    ASGI_THREADS))
@@ -0,0 +1,56 @@
+from models import db, Question
+
+FILTER_COLUMNS = ['category', 'difficulty']
+
+"""
+delete_questions(question_ids, filters, dry_run, batch_size)
+    removes questions either by id, with one set-based DELETE per batch
+    of ids, or by a category/difficulty filter with a single DELETE.
+    Every batch runs in one transaction that is committed at the end,
+    and a dry run only reports what would be removed.
+"""
+
+
+def matching_question_ids(question_ids=None, filters=None, batch_size=1000):
+    if question_ids is None:
+        return [question_id for question_id, in (
+            db.session
+            .query(Question.id)
+            .filter_by(**filters)
+            .order_by(Question.id))]
+
+    matched = []
+    for start in range(0, len(question_ids), batch_size):
+        batch = question_ids[start:start + batch_size]
+        matched.extend(question_id for question_id, in (
+            db.session
+            .query(Question.id)
+            .filter(Question.id.in_(batch))))
+    return sorted(matched)
+
+
+def delete_questions(question_ids=None, filters=None, dry_run=False,
+                     batch_size=1000):
+    if dry_run:
+        matched = matching_question_ids(question_ids, filters, batch_size)
+        return {'matched': len(matched), 'deleted': 0, 'ids': matched}
+
+    deleted = 0
+    try:
+        if question_ids is None:
+            deleted = (db.session
+                       .query(Question)
+                       .filter_by(**filters)
+                       .delete(synchronize_session=False))
+        else:
+            for start in range(0, len(question_ids), batch_size):
+                batch = question_ids[start:start + batch_size]
+                deleted += (db.session
+                            .query(Question)
+                            .filter(Question.id.in_(batch))
+                            .delete(synchronize_session=False))
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+    return {'matched': deleted, 'deleted': deleted, 'ids': None}
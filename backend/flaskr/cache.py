@@ -0,0 +1,154 @@
+import functools
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from urllib.parse import urlencode
+
+from flask import Response, make_response, request
+
+from .quiz import category_key
+
+"""
+CategoryCache
+    process-local id -> type map of the categories table, loaded with a
+    single query and reused until `ttl` seconds pass or invalidate() is
+    called. Question.category ids resolve to names from the same map,
+    without a join or an extra query.
+"""
+
+
+class CategoryCache:
+
+    def __init__(self, load, ttl=3600):
+        self.load = load
+        self.ttl = ttl
+        self.lock = threading.Lock()
+        self.types = None
+        self.expires_at = 0
+
+    def stale(self):
+        return self.types is None or time.monotonic() >= self.expires_at
+
+    def all(self):
+        with self.lock:
+            if self.stale():
+                self.rebuild_unlocked(self.load())
+            return self.types
+
+    def rebuild(self, categories):
+        with self.lock:
+            self.rebuild_unlocked(categories)
+
+    def rebuild_unlocked(self, categories):
+        self.types = {category.id: category.type for category in categories}
+        self.expires_at = time.monotonic() + self.ttl
+
+    def get(self, category_id):
+        return self.all().get(category_key(category_id))
+
+    def invalidate(self):
+        with self.lock:
+            self.types = None
+
+
+"""
+LRUCacheBackend
+    bounded in-process key/value store with per-entry expiry. Any object
+    with get(key), set(key, value, ttl) and clear() can replace it, e.g.
+    a shared cache for multi-process deployments.
+"""
+
+
+class LRUCacheBackend:
+
+    def __init__(self, max_entries=1024):
+        self.max_entries = max_entries
+        self.lock = threading.Lock()
+        self.entries = OrderedDict()
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if time.monotonic() >= expires_at:
+                del self.entries[key]
+                return None
+            self.entries.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl):
+        with self.lock:
+            self.entries[key] = (time.monotonic() + ttl, value)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+
+"""
+ResponseCache
+    caches successful GET responses by path and query string. Each
+    response carries a strong ETag hashed from its body, so every worker
+    serving the same data issues the same tag and a matching
+    If-None-Match is answered with 304, before the view runs when the
+    response is cached. Writes bump a data version that drops cached
+    responses, and an entry is kept for at most `ttl` seconds, so a
+    worker that missed another worker's write never confirms a copy for
+    longer than that. A `ttl` of 0 turns caching off: views are served
+    as they are, without ETags.
+"""
+
+
+class ResponseCache:
+
+    def __init__(self, backend=None, ttl=30):
+        self.backend = backend or LRUCacheBackend()
+        self.ttl = ttl
+        self.lock = threading.Lock()
+        self.version = 0
+
+    def bump(self):
+        with self.lock:
+            self.version += 1
+        self.backend.clear()
+
+    def etag(self, body):
+        return hashlib.sha1(body).hexdigest()[:24]
+
+    def cached(self, view):
+        if self.ttl <= 0:
+            return view
+
+        @functools.wraps(view)
+        def wrapper(*args, **kwargs):
+            key = request.path + '?' + urlencode(
+                sorted(request.args.items(multi=True)))
+            # Responses rendered before a write must not be kept after it
+            version = self.version
+            entry = self.backend.get(key)
+            if entry is not None and entry['version'] == version:
+                etag = entry['etag']
+                response = Response(entry['body'], mimetype=entry['mimetype'])
+            else:
+                response = make_response(view(*args, **kwargs))
+                if response.status_code != 200 or response.is_streamed:
+                    return response
+                body = response.get_data()
+                etag = self.etag(body)
+                self.backend.set(key, {
+                    'version': version,
+                    'etag': etag,
+                    'body': body,
+                    'mimetype': response.mimetype
+                }, self.ttl)
+            if request.if_none_match.contains(etag):
+                response = Response(status=304)
+            response.set_etag(etag)
+            return response
+        return wrapper
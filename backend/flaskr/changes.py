@@ -0,0 +1,192 @@
+import fcntl
+import json
+import logging
+import os
+import select
+import threading
+import time
+import uuid
+
+from sqlalchemy import text
+
+logger = logging.getLogger(__name__)
+
+# Change events, published after the write committed
+QUESTION_CREATED = 'question_created'
+QUESTION_DELETED = 'question_deleted'
+QUESTIONS_CHANGED = 'questions_changed'
+CATEGORIES_CHANGED = 'categories_changed'
+# Something changed, but what is unknown, e.g. notifications were lost
+CHANGED = 'changed'
+
+"""
+Change channels
+    keep the in-process caches of several worker processes coherent.
+    The repository publishes an event for every committed write, and
+    each worker polls the channel before it handles a request, applying
+    the events of the other workers to its own caches. poll() returns
+    (event, question_id) pairs and is cheap enough to run per request
+    once poll_interval seconds passed. publish() runs after the write
+    committed, so it logs failures instead of failing the request; the
+    other workers then catch up through their cache TTLs. Notifications
+    that are not ours, e.g. sent by hand on the same channel, are
+    logged and skipped.
+
+    FileChangeChannel   single host: a version counter in a file shared
+                        by the workers, any change invalidates everything
+    PostgresChangeChannel
+                        LISTEN/NOTIFY on the primary database, events
+                        carry the question id so it can be patched in
+"""
+
+
+class FileChangeChannel:
+
+    def __init__(self, path, poll_interval=0):
+        self.path = path
+        self.poll_interval = poll_interval
+        self.lock = threading.Lock()
+        self.seen = self.read()
+        self.polled_at = 0
+
+    def read(self):
+        try:
+            with open(self.path) as counter:
+                fcntl.flock(counter, fcntl.LOCK_SH)
+                return int(counter.read() or 0)
+        except FileNotFoundError:
+            return 0
+
+    def publish(self, event, question_id=None):
+        try:
+            with open(self.path, 'a+') as counter:
+                fcntl.flock(counter, fcntl.LOCK_EX)
+                counter.seek(0)
+                version = int(counter.read() or 0)
+                counter.seek(0)
+                counter.truncate()
+                counter.write(str(version + 1))
+        except (OSError, ValueError):
+            logger.exception('could not publish %s to %s', event, self.path)
+            return
+        # Only skip our own change when no other change came before it
+        with self.lock:
+            if version == self.seen:
+                self.seen = version + 1
+
+    def poll(self):
+        with self.lock:
+            now = time.monotonic()
+            if now < self.polled_at + self.poll_interval:
+                return []
+            self.polled_at = now
+            version = self.read()
+            if version == self.seen:
+                return []
+            self.seen = version
+            return [(CHANGED, None)]
+
+
+class PostgresChangeChannel:
+
+    def __init__(self, engine, channel='trivia_changes', poll_interval=0):
+        self.engine = engine
+        self.channel = channel
+        self.poll_interval = poll_interval
+        self.lock = threading.Lock()
+        self.origin = None
+        self.pid = None
+        self.listener = None
+        self.lost = False
+        self.polled_at = 0
+
+    def own_origin(self):
+        # Forked workers get an origin and listening connection of their own
+        if self.pid != os.getpid():
+            self.pid = os.getpid()
+            self.origin = f'{self.pid}-{uuid.uuid4().hex[:8]}'
+            self.listener = None
+        return self.origin
+
+    def publish(self, event, question_id=None):
+        payload = json.dumps([self.own_origin(), event, question_id])
+        try:
+            with self.engine.begin() as connection:
+                connection.execute(
+                    text('SELECT pg_notify(:channel, :payload)'),
+                    {'channel': self.channel, 'payload': payload})
+        except Exception:
+            logger.exception('could not publish %s on %s', event,
+                             self.channel)
+
+    def listen(self):
+        # A connection of its own, taken out of the pool for good
+        pooled = self.engine.raw_connection()
+        pooled.detach()
+        connection = pooled.connection
+        connection.rollback()
+        connection.autocommit = True
+        with connection.cursor() as cursor:
+            cursor.execute(f'LISTEN "{self.channel}"')
+        return connection
+
+    def drop_listener(self):
+        # Callers must hold self.lock
+        if self.listener is not None:
+            try:
+                self.listener.close()
+            except Exception:
+                pass
+        self.listener, self.lost = None, True
+
+    def poll(self):
+        with self.lock:
+            now = time.monotonic()
+            if now < self.polled_at + self.poll_interval:
+                return []
+            self.polled_at = now
+            origin = self.own_origin()
+            try:
+                if self.listener is None:
+                    self.listener = self.listen()
+                    # Changes made while the listener was lost went unheard
+                    if self.lost:
+                        self.lost = False
+                        return [(CHANGED, None)]
+                if select.select([self.listener], [], [], 0)[0]:
+                    self.listener.poll()
+            except Exception:
+                self.drop_listener()
+                return [(CHANGED, None)]
+
+            events = []
+            while self.listener.notifies:
+                notification = self.listener.notifies.pop(0)
+                change = self.parse(notification.payload)
+                if change is None:
+                    logger.warning('skipped malformed change %r on %s',
+                                   notification.payload, self.channel)
+                elif change[0] != origin:
+                    events.append(change[1:])
+            return events
+
+    def parse(self, payload):
+        # (sender, event, question_id), or None for foreign payloads
+        try:
+            sender, event, question_id = json.loads(payload)
+        except (TypeError, ValueError):
+            return None
+        if not isinstance(event, str) or not (
+                question_id is None or type(question_id) is int):
+            return None
+        return sender, event, question_id
+
+
+def change_channel(name, engine=None, path=None, poll_interval=0):
+    if name == 'file':
+        return FileChangeChannel(path, poll_interval=poll_interval)
+    if name == 'postgres':
+        return PostgresChangeChannel(engine, poll_interval=poll_interval)
+    if name not in (None, '', 'none'):
+        raise ValueError(f'unknown change channel {name!r}')
+    return None
@@ -0,0 +1,73 @@
+import json
+import os
+
+import click
+from flask.cli import AppGroup
+
+from models import db, Category
+
+from settings import BULK_BATCH_SIZE
+from .ingest import import_questions, read_csv, read_json, read_ndjson
+from .migrations import upgrade_schema
+
+trivia_cli = AppGroup('trivia', help='Manage the trivia question bank.')
+
+"""
+flask trivia import PATH
+    bulk loads questions from a JSON array, NDJSON or CSV file with
+    batched inserts, printing the rows that were rejected
+"""
+
+
+@trivia_cli.command(
+    'import', help='Import questions from a JSON, NDJSON or CSV file.')
+@click.argument('path', type=click.Path(exists=True, dir_okay=False))
+@click.option('--format', 'file_format',
+              type=click.Choice(['json', 'ndjson', 'csv']),
+              help='File format, guessed from the extension by default.')
+@click.option('--batch-size', default=BULK_BATCH_SIZE,
+              show_default=True, type=click.IntRange(min=1),
+              help='Rows per INSERT batch.')
+def import_command(path, file_format, batch_size):
+    file_format = file_format or os.path.splitext(path)[1].lstrip('.')
+    with open(path, newline='', encoding='utf-8') as source:
+        if file_format == 'csv':
+            rows = read_csv(source)
+        elif file_format == 'ndjson':
+            rows = read_ndjson(source)
+        elif file_format == 'json':
+            try:
+                rows = read_json(json.load(source))
+            except ValueError as error:
+                raise click.ClickException(str(error))
+        else:
+            raise click.UsageError('cannot guess the format, use --format')
+        categories = {category_id for category_id, in
+                      db.session.query(Category.id)}
+        result = import_questions(rows, batch_size=batch_size,
+                                  categories=categories)
+
+    for error in result['errors']:
+        click.echo(f"row {error['row']}: {error['error']}", err=True)
+    click.echo(f"Imported {result['inserted']} questions, "
+               f"{len(result['errors'])} rows rejected.")
+
+
+"""
+flask trivia upgrade-schema
+    migrates an existing database to the typed, indexed
+    questions.category foreign key, backfilling in batches
+"""
+
+
+@trivia_cli.command(
+    'upgrade-schema',
+    help='Upgrade the questions table to the current schema.')
+@click.option('--batch-size', default=10000, show_default=True,
+              type=click.IntRange(min=1),
+              help='Question ids per backfill transaction.')
+def upgrade_schema_command(batch_size):
+    try:
+        upgrade_schema(db.engine, batch_size=batch_size, echo=click.echo)
+    except RuntimeError as error:
+        raise click.ClickException(str(error))
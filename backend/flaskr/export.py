@@ -0,0 +1,55 @@
+import csv
+import io
+import json
+
+from models import db, Question
+
+EXPORT_COLUMNS = ['id', 'question', 'answer', 'difficulty', 'category']
+
+"""
+Question export
+    rows are read through a server-side cursor (stream_results with
+    yield_per) as plain column tuples and encoded in chunks, so memory
+    stays flat no matter how large the question bank is
+"""
+
+
+def export_rows(category_id=None, chunk_size=1000):
+    query = db.session.query(*(getattr(Question, column)
+                               for column in EXPORT_COLUMNS))
+    if category_id is not None:
+        query = query.filter(Question.category == category_id)
+    return (query
+            .order_by(Question.id)
+            .execution_options(stream_results=True)
+            .yield_per(chunk_size))
+
+
+def encode_ndjson(rows, chunk_size=1000):
+    lines = []
+    for row in rows:
+        lines.append(json.dumps(dict(zip(EXPORT_COLUMNS, row))))
+        if len(lines) >= chunk_size:
+            yield '\n'.join(lines) + '\n'
+            lines = []
+    if lines:
+        yield '\n'.join(lines) + '\n'
+
+
+def encode_csv(rows, chunk_size=1000):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(EXPORT_COLUMNS)
+    for number, row in enumerate(rows, start=1):
+        writer.writerow(row)
+        if number % chunk_size == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue()
+
+
+EXPORT_FORMATS = {
+    'ndjson': (encode_ndjson, 'application/x-ndjson'),
+    'csv': (encode_csv, 'text/csv')
+}
@@ -0,0 +1,111 @@
+import csv
+import json
+
+from models import db, Question
+from .quiz import category_key
+
+REQUIRED_KEYS = ['question', 'answer', 'difficulty', 'category']
+
+
+def valid_question_format(body, categories=None):
+    # Verify the body is an object with all required keys present
+    if not isinstance(body, dict):
+        return False
+    is_present = all(key in body for key in REQUIRED_KEYS)
+    if not is_present:
+        return False
+
+    # Verify all keys have non zero or empty values
+    has_values = all(body[key] for key in REQUIRED_KEYS)
+    if not has_values:
+        return False
+
+    # Verify the category exists when the known categories are given
+    if categories is not None:
+        return category_key(body['category']) in categories
+    return True
+
+
+"""
+Readers
+    each yields (row number, row) pairs, or (row number, None) for a
+    line that could not be parsed, so one bad line is reported instead
+    of failing the whole import
+"""
+
+
+def read_ndjson(lines):
+    for number, line in enumerate(lines, start=1):
+        try:
+            if isinstance(line, bytes):
+                line = line.decode('utf-8')
+            if not line.strip():
+                continue
+            row = json.loads(line)
+        except ValueError:
+            # Also covers UnicodeDecodeError
+            yield number, None
+            continue
+        yield number, row
+
+
+def read_json(rows):
+    if isinstance(rows, dict):
+        rows = rows.get('questions')
+    if not isinstance(rows, list):
+        raise ValueError('expected a JSON array of questions')
+    return enumerate(rows, start=1)
+
+
+def read_csv(lines):
+    return enumerate(csv.DictReader(lines), start=1)
+
+
+"""
+import_questions(numbered_rows, batch_size, categories)
+    validates rows with valid_question_format and inserts the valid ones
+    with one executemany INSERT per batch, committing per batch. When a
+    batch is rejected by the database it is retried row by row, so only
+    the offending rows are reported as errors.
+"""
+
+
+def import_questions(numbered_rows, batch_size=1000, categories=None):
+    inserted, errors, batch = 0, [], []
+
+    def flush():
+        if not batch:
+            return 0
+        try:
+            db.session.execute(Question.__table__.insert(),
+                               [row for _, row in batch])
+            db.session.commit()
+            return len(batch)
+        except Exception:
+            db.session.rollback()
+
+        # Isolate the rows the database rejected
+        count = 0
+        for number, row in batch:
+            try:
+                db.session.execute(Question.__table__.insert(), row)
+                db.session.commit()
+                count += 1
+            except Exception as error:
+                db.session.rollback()
+                errors.append({'row': number,
+                               'error': str(error.__cause__ or error)
+                               .splitlines()[0]})
+        return count
+
+    for number, row in numbered_rows:
+        if not valid_question_format(row, categories):
+            errors.append({'row': number, 'error': 'invalid question format'})
+            continue
+        batch.append((number, {key: row[key] for key in REQUIRED_KEYS}))
+        if len(batch) >= batch_size:
+            inserted += flush()
+            batch.clear()
+    inserted += flush()
+
+    return {'inserted': inserted, 'errors': errors}
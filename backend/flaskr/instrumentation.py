@@ -0,0 +1,243 @@
+import json
+import logging
+import re
+import threading
+import time
+from collections import Counter, defaultdict
+
+from flask import g, has_request_context, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+logger = logging.getLogger(__name__)
+
+# Upper bounds, in seconds, of the request duration histogram buckets
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+# A SELECT of table rows, not a count, with neither WHERE nor LIMIT
+UNBOUNDED_SELECT = re.compile(
+    r'^\s*SELECT\b(?!\s+count\()(?!.*\b(WHERE|LIMIT)\b).*\bFROM\b',
+    re.IGNORECASE | re.DOTALL)
+
+"""
+RequestMetrics
+    wall time, SQL statement count, SQL time and rows of one request,
+    kept in g.request_metrics while instrumentation is on. Rows are
+    what the driver reports as the cursor rowcount: psycopg2 reports
+    selected rows, SQLite only rows written.
+"""
+
+
+class RequestMetrics:
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.duration = 0.0
+        self.queries = 0
+        self.sql_seconds = 0.0
+        self.rows = 0
+        self.statements = Counter()
+        self.unbounded_selects = []
+
+    def record(self, statement, seconds, rowcount):
+        self.queries += 1
+        self.sql_seconds += seconds
+        if rowcount > 0:
+            self.rows += rowcount
+        self.statements[statement] += 1
+        if UNBOUNDED_SELECT.match(statement):
+            self.unbounded_selects.append(statement)
+
+    def finish(self):
+        self.duration = time.perf_counter() - self.started
+
+    def repeated_statements(self, threshold):
+        return {statement: count
+                for statement, count in self.statements.items()
+                if count >= threshold}
+
+    def server_timing(self):
+        return (f'app;dur={(self.duration - self.sql_seconds) * 1000:.2f}, '
+                f'db;dur={self.sql_seconds * 1000:.2f};'
+                f'desc="{self.queries} queries, {self.rows} rows", '
+                f'total;dur={self.duration * 1000:.2f}')
+
+
+# Every engine reports to the metrics of the current request, if any
+
+@event.listens_for(Engine, 'before_cursor_execute')
+def start_statement_timer(conn, cursor, statement, parameters, context,
+                          executemany):
+    if has_request_context() and 'request_metrics' in g:
+        conn.info.setdefault('statement_started', []).append(
+            time.perf_counter())
+
+
+@event.listens_for(Engine, 'after_cursor_execute')
+def record_statement(conn, cursor, statement, parameters, context,
+                     executemany):
+    timers = conn.info.get('statement_started')
+    if not timers or not has_request_context() or 'request_metrics' not in g:
+        return
+    seconds = time.perf_counter() - timers.pop()
+    g.request_metrics.record(statement, seconds, cursor.rowcount)
+
+
+"""
+MetricsRegistry
+    per-endpoint totals of every instrumented request of this worker,
+    rendered in the Prometheus text format together with the pool
+    statistics of the database engines
+"""
+
+
+class MetricsRegistry:
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.requests = Counter()
+        self.durations = defaultdict(lambda: [0] * len(DURATION_BUCKETS))
+        self.duration_sums = Counter()
+        self.queries = Counter()
+        self.sql_seconds = Counter()
+        self.rows = Counter()
+        self.warnings = Counter()
+
+    def observe(self, endpoint, method, status, metrics):
+        with self.lock:
+            self.requests[(endpoint, method, str(status))] += 1
+            buckets = self.durations[endpoint]
+            for position, bound in enumerate(DURATION_BUCKETS):
+                if metrics.duration <= bound:
+                    buckets[position] += 1
+            self.duration_sums[endpoint] += metrics.duration
+            self.queries[endpoint] += metrics.queries
+            self.sql_seconds[endpoint] += metrics.sql_seconds
+            self.rows[endpoint] += metrics.rows
+
+    def warn(self, endpoint, kind):
+        with self.lock:
+            self.warnings[(endpoint, kind)] += 1
+
+    def render(self, pools=None):
+        lines = []
+
+        def family(name, kind, description, samples):
+            lines.append(f'# HELP {name} {description}')
+            lines.append(f'# TYPE {name} {kind}')
+            for labels, value in samples:
+                lines.append(f'{name}{format_labels(labels)} {value}')
+
+        with self.lock:
+            family('trivia_requests_total', 'counter',
+                   'Requests served, by endpoint, method and status.',
+                   [({'endpoint': endpoint, 'method': method,
+                      'status': status}, count)
+                    for (endpoint, method, status), count
+                    in sorted(self.requests.items())])
+            name = 'trivia_request_duration_seconds'
+            family(name, 'histogram', 'Wall time of requests, by endpoint.',
+                   [])
+            for endpoint, buckets in sorted(self.durations.items()):
+                count = sum(count for (observed, _, _), count
+                            in self.requests.items() if observed == endpoint)
+                for bound, bucket in zip(DURATION_BUCKETS + ('+Inf',),
+                                         buckets + [count]):
+                    lines.append(f'{name}_bucket' + format_labels(
+                        {'endpoint': endpoint, 'le': bound}) + f' {bucket}')
+                labels = format_labels({'endpoint': endpoint})
+                lines.append(f'{name}_sum{labels} '
+                             f'{self.duration_sums[endpoint]:.6f}')
+                lines.append(f'{name}_count{labels} {count}')
+            for name, description, totals in (
+                    ('trivia_sql_queries_total',
+                     'SQL statements executed, by endpoint.', self.queries),
+                    ('trivia_sql_duration_seconds_total',
+                     'Time spent executing SQL, by endpoint.',
+                     self.sql_seconds),
+                    ('trivia_sql_rows_total',
+                     'Rows reported by the database driver, by endpoint.',
+                     self.rows)):
+                family(name, 'counter', description,
+                       [({'endpoint': endpoint}, round(total, 6))
+                        for endpoint, total in sorted(totals.items())])
+            family('trivia_query_warnings_total', 'counter',
+                   'Requests flagged for repeated (n_plus_one) or '
+                   'unbounded (full_table) queries.',
+                   [({'endpoint': endpoint, 'kind': kind}, count)
+                    for (endpoint, kind), count
+                    in sorted(self.warnings.items())])
+
+        for key in ('size', 'checked_in', 'checked_out', 'overflow',
+                    'checkouts', 'timeouts', 'total_wait_seconds'):
+            family(f'trivia_db_pool_{key}', 'gauge',
+                   f'Connection pool {key.replace("_", " ")}.',
+                   [({'engine': name}, statistics[key])
+                    for name, statistics in (pools or {}).items()
+                    if key in statistics])
+        return '\n'.join(lines) + '\n'
+
+
+def format_labels(labels):
+    escaped = (str(value).replace('\\', '\\\\').replace('"', '\\"')
+               .replace('\n', '\\n') for value in labels.values())
+    return '{' + ','.join(f'{name}="{value}"' for name, value
+                          in zip(labels, escaped)) + '}'
+
+
+"""
+instrument_app(app, registry, repeated_threshold, full_table_rows)
+    times every request of app and the SQL it runs. Responses get a
+    Server-Timing header, each request is logged as one JSON line, and
+    requests running the same statement repeated_threshold times (an
+    N+1 pattern) or a SELECT without WHERE or LIMIT are logged as
+    warnings. Full-table loads are only flagged from full_table_rows
+    rows on, when the driver reports the row count.
+"""
+
+
+def instrument_app(app, registry, repeated_threshold=10,
+                   full_table_rows=1000):
+
+    @app.before_request
+    def start_request_metrics():
+        g.request_metrics = RequestMetrics()
+
+    @app.after_request
+    def report_request_metrics(response):
+        metrics = g.pop('request_metrics', None)
+        if metrics is None:
+            return response
+        metrics.finish()
+        endpoint = request.endpoint or 'unmatched'
+        response.headers['Server-Timing'] = metrics.server_timing()
+        registry.observe(endpoint, request.method, response.status_code,
+                         metrics)
+
+        repeated = metrics.repeated_statements(repeated_threshold)
+        if repeated:
+            registry.warn(endpoint, 'n_plus_one')
+            logger.warning(json.dumps({
+                'event': 'n_plus_one', 'endpoint': endpoint,
+                'statements': [{'sql': statement, 'count': count}
+                               for statement, count in repeated.items()]}))
+        if metrics.unbounded_selects and (
+                metrics.rows == 0 or metrics.rows >= full_table_rows):
+            registry.warn(endpoint, 'full_table')
+            logger.warning(json.dumps({
+                'event': 'full_table', 'endpoint': endpoint,
+                'rows': metrics.rows,
+                'statements': sorted(set(metrics.unbounded_selects))}))
+
+        logger.info(json.dumps({
+            'event': 'request',
+            'endpoint': endpoint,
+            'method': request.method,
+            'path': request.path,
+            'status': response.status_code,
+            'duration_ms': round(metrics.duration * 1000, 3),
+            'sql_queries': metrics.queries,
+            'sql_ms': round(metrics.sql_seconds * 1000, 3),
+            'sql_rows': metrics.rows
+        }))
+        return response
@@ -0,0 +1,120 @@
+from sqlalchemy import Integer, inspect, text
+
+"""
+upgrade_schema(engine, batch_size, echo)
+    brings a questions table created by older versions of models.py,
+    where `category` was a VARCHAR, up to the current schema:
+
+    1. copies category into a new integer column in batches of ids,
+       committing after every batch so locks stay short. A trigger
+       keeps the new column in step with rows inserted or updated
+       meanwhile; the columns are swapped with the table locked, after
+       a last pass over rows the batches did not see.
+    2. clears category ids that no longer exist and adds the foreign
+       key to categories.id as NOT VALID before validating it
+    3. creates the category, difficulty and full-text indexes
+       CONCURRENTLY, so reads and writes continue meanwhile
+
+    Every step is skipped when it was already applied, so the upgrade
+    can be re-run after an interruption. Only Postgres is supported;
+    other databases get the indexes from create_all().
+"""
+
+QUESTION_INDEXES = {
+    'ix_questions_category_id': 'btree (category, id)',
+    'ix_questions_difficulty': 'btree (difficulty)',
+    'ix_questions_question_fts':
+        "gin (to_tsvector('english'::regconfig, question))",
+    'ix_questions_answer_fts':
+        "gin (to_tsvector('english'::regconfig, answer))",
+}
+
+
+# Integer category id of a VARCHAR category, NULL when not a number
+CATEGORY_ID = "CASE WHEN {0} ~ '^[0-9]+$' THEN {0}::integer END"
+
+
+def backfill_category_ids(engine, batch_size, echo):
+    with engine.begin() as connection:
+        connection.execute(text(
+            'ALTER TABLE questions ADD COLUMN IF NOT EXISTS '
+            'category_id integer'))
+        connection.execute(text(
+            'CREATE OR REPLACE FUNCTION questions_sync_category_id() '
+            'RETURNS trigger LANGUAGE plpgsql AS $$ BEGIN '
+            f'NEW.category_id := {CATEGORY_ID.format("NEW.category")}; '
+            'RETURN NEW; END $$'))
+        connection.execute(text(
+            'DROP TRIGGER IF EXISTS questions_sync_category_id '
+            'ON questions'))
+        connection.execute(text(
+            'CREATE TRIGGER questions_sync_category_id '
+            'BEFORE INSERT OR UPDATE OF category ON questions '
+            'FOR EACH ROW EXECUTE PROCEDURE questions_sync_category_id()'))
+        low, high = connection.execute(text(
+            'SELECT min(id), max(id) FROM questions')).one()
+
+    for start in range(low or 0, (high or 0) + 1, batch_size):
+        with engine.begin() as connection:
+            connection.execute(text(
+                'UPDATE questions SET category_id = '
+                f'{CATEGORY_ID.format("category")} '
+                'WHERE id >= :start AND id < :end'),
+                {'start': start, 'end': start + batch_size})
+        echo(f'Backfilled question ids {start} to {start + batch_size - 1}')
+
+    with engine.begin() as connection:
+        connection.execute(text(
+            'LOCK TABLE questions IN ACCESS EXCLUSIVE MODE'))
+        connection.execute(text(
+            'UPDATE questions SET category_id = category::integer '
+            "WHERE category_id IS NULL AND category ~ '^[0-9]+$'"))
+        connection.execute(text(
+            'DROP TRIGGER questions_sync_category_id ON questions'))
+        connection.execute(text(
+            'DROP FUNCTION questions_sync_category_id()'))
+        connection.execute(text('ALTER TABLE questions DROP COLUMN category'))
+        connection.execute(text(
+            'ALTER TABLE questions RENAME COLUMN category_id TO category'))
+    echo('Converted questions.category to integer')
+
+
+def add_category_foreign_key(engine, echo):
+    with engine.begin() as connection:
+        connection.execute(text(
+            'UPDATE questions SET category = NULL '
+            'WHERE category IS NOT NULL AND category NOT IN '
+            '(SELECT id FROM categories)'))
+        connection.execute(text(
+            'ALTER TABLE questions ADD CONSTRAINT category '
+            'FOREIGN KEY (category) REFERENCES categories (id) '
+            'ON UPDATE CASCADE ON DELETE SET NULL NOT VALID'))
+    with engine.begin() as connection:
+        connection.execute(text(
+            'ALTER TABLE questions VALIDATE CONSTRAINT category'))
+    echo('Added foreign key questions.category -> categories.id')
+
+
+def upgrade_schema(engine, batch_size=10000, echo=print):
+    if engine.dialect.name != 'postgresql':
+        raise RuntimeError('schema upgrades are only supported on Postgres')
+
+    inspector = inspect(engine)
+    columns = {column['name']: column
+               for column in inspector.get_columns('questions')}
+    if not isinstance(columns['category']['type'], Integer):
+        backfill_category_ids(engine, batch_size, echo)
+
+    foreign_keys = inspect(engine).get_foreign_keys('questions')
+    if not any(key['constrained_columns'] == ['category']
+               for key in foreign_keys):
+        add_category_foreign_key(engine, echo)
+
+    # CREATE INDEX CONCURRENTLY cannot run inside a transaction
+    with engine.connect().execution_options(
+            isolation_level='AUTOCOMMIT') as connection:
+        for name, definition in QUESTION_INDEXES.items():
+            connection.execute(text(
+                f'CREATE INDEX CONCURRENTLY IF NOT EXISTS {name} '
+                f'ON questions USING {definition}'))
+            echo(f'Ensured index {name}')
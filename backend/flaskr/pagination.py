@@ -0,0 +1,69 @@
+import base64
+import binascii
+import json
+
+"""
+paginate_query(query, page, after_id, per_page)
+    applies LIMIT/OFFSET (page) or keyset (after_id) pagination
+    to a query ordered by id and returns only the rows of that page
+"""
+
+
+def paginate_query(query, model, page=1, after_id=None, per_page=10):
+    if after_id is not None:
+        query = query.filter(model.id > after_id)
+    elif page < 1:
+        return []
+    else:
+        query = query.offset((page - 1) * per_page)
+    return query.limit(per_page).all()
+
+
+"""
+Opaque continuation tokens
+    a cursor is the url-safe base64 of the last sort key seen, so deep
+    pages are fetched with `WHERE id > :last_id` instead of an OFFSET
+"""
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def encode_cursor(last_id):
+    payload = json.dumps({'id': last_id}, separators=(',', ':'))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    if not cursor:
+        return None
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded))
+        return int(payload['id'])
+    except (ValueError, TypeError, KeyError, binascii.Error):
+        raise InvalidCursor(cursor)
+
+
+"""
+paginate_cursor(query, model, after_id, per_page)
+    returns one keyset page of rows and the cursor of the next page,
+    or None as the cursor when this is the last page. cursor_page cuts
+    the rows of a query that fetched one row more than per_page.
+"""
+
+
+def paginate_cursor(query, model, after_id=None, per_page=10):
+    if after_id is not None:
+        query = query.filter(model.id > after_id)
+    rows = query.order_by(model.id).limit(per_page + 1).all()
+    return cursor_page(rows, per_page)
+
+
+def cursor_page(rows, per_page=10):
+    next_cursor = None
+    if len(rows) > per_page:
+        rows = rows[:per_page]
+        next_cursor = encode_cursor(rows[-1].id)
+    return rows, next_cursor
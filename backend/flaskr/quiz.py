@@ -0,0 +1,339 @@
+import bisect
+import math
+import random
+import threading
+import time
+from itertools import accumulate
+
+# Rejection sampling is abandoned for an explicit difference once this
+# many draws in a row have landed on already seen questions.
+MAX_DRAW_ATTEMPTS = 16
+
+
+# Most questions a single quiz request may ask for
+MAX_QUIZ_COUNT = 50
+
+# Questions per difficulty level before the ramp strategy moves up
+QUESTIONS_PER_LEVEL = 1
+
+# Relative weight of questions a player has mastered, others weigh 1
+MASTERED_WEIGHT = 0.1
+
+
+def category_key(category):
+    try:
+        return int(category)
+    except (TypeError, ValueError):
+        return category
+
+
+"""
+IdBucket
+    a list of ids plus an id -> position map, giving O(1) add,
+    discard, membership and uniform random choice
+"""
+
+
+class IdBucket:
+
+    def __init__(self):
+        self.ids = []
+        self.positions = {}
+
+    def __len__(self):
+        return len(self.ids)
+
+    def __contains__(self, question_id):
+        return question_id in self.positions
+
+    def add(self, question_id):
+        if question_id not in self.positions:
+            self.positions[question_id] = len(self.ids)
+            self.ids.append(question_id)
+
+    def discard(self, question_id):
+        position = self.positions.pop(question_id, None)
+        if position is None:
+            return
+        last = self.ids.pop()
+        if position < len(self.ids):
+            self.ids[position] = last
+            self.positions[last] = position
+
+    def choice(self):
+        return self.ids[random.randrange(len(self.ids))]
+
+
+"""
+QuestionIdIndex
+    in-memory index of question ids per category, per difficulty and
+    per category and difficulty, loaded with a single (id, category,
+    difficulty) query and patched by the write handlers. Counts are
+    bucket sizes, so totals and statistics never scan the table.
+    Random unseen questions are drawn by rejection sampling against the
+    set of previous questions, so a draw does not depend on category
+    size.
+"""
+
+
+class QuestionIdIndex:
+
+    def __init__(self, load, ttl=300):
+        self.load = load
+        self.ttl = ttl
+        self.lock = threading.Lock()
+        self.everything = None
+        self.categories = {}
+        self.difficulties = {}
+        self.levels = {}
+        self.placement = {}
+        self.expires_at = 0
+
+    def stale(self):
+        return self.everything is None or time.monotonic() >= self.expires_at
+
+    def refresh_if_stale(self):
+        # Callers must hold self.lock
+        if self.stale():
+            self.rebuild_unlocked(self.load())
+
+    def rebuild(self, rows):
+        with self.lock:
+            self.rebuild_unlocked(rows)
+
+    def rebuild_unlocked(self, rows):
+        self.everything, self.categories = IdBucket(), {}
+        self.difficulties, self.levels, self.placement = {}, {}, {}
+        for question_id, category, difficulty in rows:
+            self.place(question_id, category, difficulty)
+        self.expires_at = time.monotonic() + self.ttl
+
+    def place(self, question_id, category, difficulty):
+        # Callers must hold self.lock
+        category, difficulty = category_key(category), category_key(difficulty)
+        self.everything.add(question_id)
+        self.categories.setdefault(category, IdBucket()).add(question_id)
+        self.difficulties.setdefault(difficulty, IdBucket()).add(question_id)
+        self.levels.setdefault(
+            (category, difficulty), IdBucket()).add(question_id)
+        self.placement[question_id] = (category, difficulty)
+
+    def invalidate(self):
+        with self.lock:
+            self.everything = None
+
+    def add(self, question_id, category, difficulty=None):
+        with self.lock:
+            if self.everything is None:
+                return
+            self.place(question_id, category, difficulty)
+
+    def discard(self, question_id):
+        with self.lock:
+            if self.everything is None:
+                return
+            placement = self.placement.pop(question_id, None)
+            if placement is None:
+                return
+            self.everything.discard(question_id)
+            category, difficulty = placement
+            self.categories[category].discard(question_id)
+            self.difficulties[difficulty].discard(question_id)
+            self.levels[placement].discard(question_id)
+
+    def bucket(self, category=None, difficulty=None):
+        # Callers must hold self.lock
+        self.refresh_if_stale()
+        if category is None and difficulty is None:
+            return self.everything
+        if difficulty is None:
+            return self.categories.get(category_key(category), IdBucket())
+        if category is None:
+            return self.difficulties.get(category_key(difficulty), IdBucket())
+        return self.levels.get(
+            (category_key(category), category_key(difficulty)), IdBucket())
+
+    def count(self, category=None, difficulty=None):
+        with self.lock:
+            return len(self.bucket(category, difficulty))
+
+    def statistics(self):
+        # Returns the total, {category: {difficulty: count}} and
+        # {difficulty: count}, leaving out empty buckets and questions
+        # without a difficulty
+        with self.lock:
+            self.refresh_if_stale()
+            categories = {}
+            for (category, difficulty), bucket in self.levels.items():
+                if bucket and difficulty is not None:
+                    categories.setdefault(category, {})[difficulty] = \
+                        len(bucket)
+            difficulties = {difficulty: len(bucket) for difficulty, bucket
+                            in self.difficulties.items()
+                            if bucket and difficulty is not None}
+            return len(self.everything), categories, difficulties
+
+    def difficulty_levels(self, category=None):
+        # Difficulties that have questions in the category, ascending
+        with self.lock:
+            self.refresh_if_stale()
+            if category is None:
+                levels = [difficulty for difficulty, bucket
+                          in self.difficulties.items() if bucket]
+            else:
+                category = category_key(category)
+                levels = [difficulty for (owner, difficulty), bucket
+                          in self.levels.items()
+                          if owner == category and bucket]
+            return sorted(level for level in levels if level is not None)
+
+    def count_unseen(self, category=None, difficulty=None, exclude=()):
+        with self.lock:
+            bucket = self.bucket(category, difficulty)
+            return len(bucket) - sum(1 for question_id in exclude
+                                     if question_id in bucket)
+
+    def draw(self, category=None, exclude=(), difficulty=None, weight=None):
+        # weight(question_id) in [0, 1] thins out questions by rejection;
+        # without it every unseen question is equally likely
+        with self.lock:
+            bucket = self.bucket(category, difficulty)
+            excluded = {question_id for question_id in exclude
+                        if question_id in bucket}
+            if len(excluded) >= len(bucket):
+                return None
+
+            for _ in range(MAX_DRAW_ATTEMPTS):
+                question_id = bucket.choice()
+                if question_id in excluded:
+                    continue
+                if weight is None or random.random() < weight(question_id):
+                    return question_id
+
+            # Most of the bucket has been seen, pick from what is left
+            remaining = [question_id for question_id in bucket.ids
+                         if question_id not in excluded]
+            if weight is None:
+                return random.choice(remaining)
+            position = weighted_choice(
+                [weight(question_id) for question_id in remaining])
+            return remaining[position] if position is not None else None
+
+
+def weighted_choice(weights):
+    # Index picked in proportion to its weight, by bisecting the
+    # cumulative weights, or None when every weight is zero
+    cumulative = list(accumulate(weights))
+    if not cumulative or cumulative[-1] <= 0:
+        return None
+    return bisect.bisect_right(cumulative, random.random() * cumulative[-1])
+
+
+"""
+Quiz selection strategies
+    each picks the next unseen question id of a category, or None when
+    none is left, from the buckets of a QuestionIdIndex, so a draw costs
+    O(1) expected, or O(log n) over the difficulty levels, independent
+    of the size of the bank.
+
+    uniform   every unseen question alike
+    ramp      the first QUESTIONS_PER_LEVEL questions from the easiest
+              level, then one level up at a time, falling back to the
+              nearest level with unseen questions
+    weighted  a level in proportion to its unseen questions times its
+              `difficulty_weights` entry (1 by default), then a question
+              of that level, where `mastered` ids weigh MASTERED_WEIGHT
+"""
+
+
+def draw_uniform(index, category, exclude, options):
+    return index.draw(category, exclude)
+
+
+def draw_ramp(index, category, exclude, options):
+    levels = index.difficulty_levels(category)
+    if not levels:
+        return None
+    target = levels[min(len(exclude) // QUESTIONS_PER_LEVEL, len(levels) - 1)]
+    for difficulty in sorted(levels, key=lambda level:
+                             (abs(level - target), -level)):
+        question_id = index.draw(category, exclude, difficulty=difficulty)
+        if question_id is not None:
+            return question_id
+    return None
+
+
+def draw_weighted(index, category, exclude, options):
+    difficulty_weights = options.get('difficulty_weights', {})
+    mastered = options.get('mastered', set())
+    levels = [(difficulty, difficulty_weights.get(difficulty, 1.0)
+               * index.count_unseen(category, difficulty, exclude))
+              for difficulty in index.difficulty_levels(category)]
+    while levels:
+        position = weighted_choice([weight for _, weight in levels])
+        if position is None:
+            return None
+        question_id = index.draw(
+            category, exclude, difficulty=levels[position][0],
+            weight=lambda question_id:
+                MASTERED_WEIGHT if question_id in mastered else 1.0)
+        if question_id is not None:
+            return question_id
+        del levels[position]
+    return None
+
+
+QUIZ_STRATEGIES = {
+    'uniform': draw_uniform,
+    'ramp': draw_ramp,
+    'weighted': draw_weighted
+}
+
+
+class UnknownStrategy(ValueError):
+    pass
+
+
+def quiz_strategy(body):
+    # Returns the strategy and its options named by a quiz request body,
+    # raising UnknownStrategy, or ValueError and TypeError on bad options
+    name = body.get('strategy') or 'uniform'
+    if name not in QUIZ_STRATEGIES:
+        raise UnknownStrategy(name)
+    options = {}
+    if body.get('difficulty_weights'):
+        options['difficulty_weights'] = {
+            int(difficulty): float(weight) for difficulty, weight
+            in body['difficulty_weights'].items()}
+        if not all(math.isfinite(weight) and weight >= 0 for weight in
+                   options['difficulty_weights'].values()):
+            raise ValueError('difficulty weights must be finite and '
+                             'not negative')
+    if body.get('mastered'):
+        options['mastered'] = {int(question_id)
+                               for question_id in body['mastered']}
+    return QUIZ_STRATEGIES[name], options
+
+
+def quiz_count(body):
+    # Number of questions asked for by a quiz request body, 1 by default,
+    # raising ValueError or TypeError outside 1..MAX_QUIZ_COUNT
+    count = body.get('count', 1)
+    if isinstance(count, bool) or int(count) != count:
+        raise TypeError('count must be an integer')
+    if not 1 <= count <= MAX_QUIZ_COUNT:
+        raise ValueError(f'count must be between 1 and {MAX_QUIZ_COUNT}')
+    return int(count)
+
+
+def draw_many(strategy, index, category, exclude, count, options):
+    # Up to count distinct unseen question ids, sampled without
+    # replacement by excluding every id drawn so far from the next draw
+    seen, drawn = set(exclude), []
+    while len(drawn) < count:
+        question_id = strategy(index, category, seen, options)
+        if question_id is None:
+            break
+        seen.add(question_id)
+        drawn.append(question_id)
+    return drawn
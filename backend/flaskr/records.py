@@ -0,0 +1,48 @@
+from models import db, Question
+from .serialization import QUESTION_COLUMNS
+
+"""
+Lightweight read path
+    read-only endpoints select the question columns as plain Row tuples
+    instead of hydrating Question entities, which skips the identity
+    map and change tracking. Rows go straight to encode_questions, or
+    into a QuestionRecord when a single question dict is needed.
+"""
+
+QUESTION_FIELDS = [getattr(Question, column) for column in QUESTION_COLUMNS]
+
+
+def select_questions():
+    return db.session.query(*QUESTION_FIELDS)
+
+
+def fetch_question_rows(question_ids):
+    # Load question rows by id, keeping the order of the given ids
+    rows = {row.id: row for row in
+            select_questions().filter(Question.id.in_(question_ids))}
+    return [rows[question_id] for question_id in question_ids
+            if question_id in rows]
+
+
+class QuestionRecord:
+    __slots__ = QUESTION_COLUMNS
+
+    def __init__(self, id, question, answer, category, difficulty):
+        self.id = id
+        self.question = question
+        self.answer = answer
+        self.category = category
+        self.difficulty = difficulty
+
+    @classmethod
+    def from_row(cls, row):
+        return cls(*row)
+
+    def format(self):
+        return {
+            'id': self.id,
+            'question': self.question,
+            'answer': self.answer,
+            'category': self.category,
+            'difficulty': self.difficulty
+        }
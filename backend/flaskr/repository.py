@@ -0,0 +1,421 @@
+import contextlib
+from itertools import chain
+
+from flask import current_app, has_app_context
+from sqlalchemy import event, func
+
+from models import Question, Category, primary_reads
+from settings import (
+    CATEGORY_CACHE_TTL,
+    QUESTION_STORE_CHECK_INTERVAL,
+    QUESTION_STORE_TTL,
+    QUIZ_INDEX_TTL,
+    QUIZ_SESSION_TTL,
+    SEARCH_INDEX_TTL
+)
+from . import batch, export, ingest
+from .cache import CategoryCache
+from .changes import (
+    CATEGORIES_CHANGED,
+    QUESTION_CREATED,
+    QUESTION_DELETED,
+    QUESTIONS_CHANGED
+)
+from .pagination import cursor_page, paginate_cursor, paginate_query
+from .quiz import QuestionIdIndex, draw_many, draw_uniform
+from .records import QUESTION_FIELDS, QuestionRecord, fetch_question_rows
+from .search import InvertedIndexQuestionSearch, PostgresQuestionSearch
+from .sessions import (
+    InMemorySessionStore,
+    SessionLocks,
+    draw_from_session,
+    new_session,
+    new_session_id,
+    remaining_in_session
+)
+from .store import ColumnarQuestionStore
+from .suggest import PrefixIndex
+
+QUESTIONS_PER_PAGE = 10
+
+"""
+Category change tracking
+    session listeners that tell the repository of the current app once
+    a change to categories commits. They are registered once per
+    session, since every app shares the scoped session of models.db.
+"""
+
+
+def track_category_changes(session, flush_context, instances):
+    changed = chain(session.new, session.dirty, session.deleted)
+    if any(isinstance(instance, Category) for instance in changed):
+        session.info['categories_changed'] = True
+
+
+def invalidate_category_types(session):
+    if session.info.pop('categories_changed', False) and has_app_context():
+        repository = current_app.extensions.get('trivia_repository')
+        if repository is not None:
+            repository.categories_changed()
+
+
+def forget_category_changes(session, previous_transaction):
+    session.info.pop('categories_changed', None)
+
+
+def watch_categories(session):
+    if event.contains(session, 'after_commit', invalidate_category_types):
+        return
+    event.listen(session, 'before_flush', track_category_changes)
+    event.listen(session, 'after_commit', invalidate_category_types)
+    event.listen(session, 'after_soft_rollback', forget_category_changes)
+
+
+def from_primary(load):
+    # Index loads read the primary, a lagging replica would leave the
+    # index behind for its whole TTL
+    def load_from_primary():
+        with primary_reads():
+            return load()
+    return load_from_primary
+
+
+"""
+TriviaRepository
+    the data layer behind the API views. Reads return plain data (dicts,
+    column rows, counts) from the database or the in-process indexes,
+    writes keep those indexes in step, so views only deal with HTTP and
+    composite endpoints reuse results in-process. Callables registered
+    with subscribe() run after every committed change to questions or
+    categories, e.g. to bump a response cache.
+
+    With question_store, listing, category pages, lookups, quiz rows
+    and search are served from a ColumnarQuestionStore instead of the
+    database, which also feeds the quiz id index.
+
+    With a change channel, writes are published to the other worker
+    processes, and sync() applies theirs to the indexes of this one.
+
+    Takes the Flask-SQLAlchemy extension. It needs an application
+    context, but no request, so it can be used and benchmarked on its
+    own. Indexes rebuilt in the background enter context() for it,
+    create_app passes the application context.
+"""
+
+
+class TriviaRepository:
+
+    def __init__(self, db, quiz_sessions=None, question_store=False,
+                 changes=None, context=contextlib.nullcontext):
+        self.db = db
+        self.session = session = db.session
+        self.listeners = []
+        self.changes = changes
+        self.question_store = None
+        load_question_ids = from_primary(lambda: session.query(
+            Question.id, Question.category, Question.difficulty).all())
+        if question_store:
+            self.question_store = ColumnarQuestionStore(
+                from_primary(lambda: self.select_questions().all()),
+                from_primary(lambda: session.query(
+                    func.count(Question.id), func.max(Question.id)).one()),
+                check_interval=QUESTION_STORE_CHECK_INTERVAL,
+                ttl=QUESTION_STORE_TTL)
+            load_question_ids = self.question_store.id_rows
+        self.question_ids = QuestionIdIndex(load_question_ids,
+                                            ttl=QUIZ_INDEX_TTL)
+        self.quiz_sessions = (
+            quiz_sessions if quiz_sessions is not None
+            else InMemorySessionStore(ttl=QUIZ_SESSION_TTL))
+        self.session_locks = SessionLocks()
+        self.postgres_search = PostgresQuestionSearch(
+            session, Question, QUESTION_FIELDS)
+        self.indexed_search = InvertedIndexQuestionSearch(
+            from_primary(lambda: session.query(
+                Question.id, Question.question, Question.answer).all()),
+            fetch_question_rows,
+            ttl=SEARCH_INDEX_TTL)
+        self.suggestions = PrefixIndex(
+            from_primary(lambda: session.query(
+                Question.id, Question.question).all()),
+            ttl=SEARCH_INDEX_TTL, context=context)
+        self.category_types = CategoryCache(
+            from_primary(lambda: session.query(Category).all()),
+            ttl=CATEGORY_CACHE_TTL)
+        watch_categories(session)
+
+    def subscribe(self, listener):
+        self.listeners.append(listener)
+
+    def notify(self):
+        for listener in self.listeners:
+            listener()
+
+    def publish(self, event, question_id=None):
+        # Tell the other worker processes, if a change channel is set up
+        if self.changes is not None:
+            self.changes.publish(event, question_id)
+
+    def sync(self):
+        # Apply the changes other workers published since the last sync
+        if self.changes is None:
+            return
+        for change, question_id in self.changes.poll():
+            if change == QUESTION_CREATED:
+                rows = fetch_question_rows([question_id])
+                if rows:
+                    self.question_created(QuestionRecord.from_row(rows[0]),
+                                          publish=False)
+            elif change == QUESTION_DELETED:
+                self.question_deleted(QuestionRecord(
+                    question_id, None, None, None, None), publish=False)
+            elif change == QUESTIONS_CHANGED:
+                self.questions_changed(publish=False)
+            else:
+                # Category changes also move questions, unknown ones may
+                # be anything
+                self.categories_changed(publish=False)
+                if change != CATEGORIES_CHANGED:
+                    self.questions_changed(publish=False)
+
+    # Keep the in-process indexes in step with the writes
+
+    def categories_changed(self, publish=True):
+        # Deleting a category also moves its questions
+        self.category_types.invalidate()
+        self.question_ids.invalidate()
+        if self.question_store is not None:
+            self.question_store.invalidate()
+        self.notify()
+        if publish:
+            self.publish(CATEGORIES_CHANGED)
+
+    def question_created(self, question, publish=True):
+        if self.question_store is not None:
+            self.question_store.add(question.id, question.question,
+                                    question.answer, question.category,
+                                    question.difficulty)
+        self.question_ids.add(question.id, question.category,
+                              question.difficulty)
+        self.indexed_search.add(question.id, question.question,
+                                question.answer)
+        self.suggestions.add(question.id, question.question)
+        self.notify()
+        if publish:
+            self.publish(QUESTION_CREATED, question.id)
+
+    def question_deleted(self, question, publish=True):
+        if self.question_store is not None:
+            self.question_store.discard(question.id)
+        self.question_ids.discard(question.id)
+        self.indexed_search.discard(question.id)
+        self.suggestions.discard(question.id)
+        self.notify()
+        if publish:
+            self.publish(QUESTION_DELETED, question.id)
+
+    def questions_changed(self, publish=True):
+        # Bulk writes rebuild the indexes lazily instead of patching them
+        if self.question_store is not None:
+            self.question_store.invalidate()
+        self.question_ids.invalidate()
+        self.indexed_search.invalidate()
+        self.suggestions.invalidate()
+        self.notify()
+        if publish:
+            self.publish(QUESTIONS_CHANGED)
+
+    # --- Categories
+
+    def categories(self):
+        return self.category_types.all()
+
+    def category_type(self, category_id):
+        return self.category_types.get(category_id)
+
+    # --- Questions
+
+    def total_questions(self, category_id=None):
+        return self.question_ids.count(category_id)
+
+    def statistics(self):
+        # Question counts per category and difficulty, from the id index
+        total, counts, difficulties = self.question_ids.statistics()
+        return {
+            'total_questions': total,
+            'categories': {
+                category_id: {
+                    'type': category_type,
+                    'total_questions': self.question_ids.count(category_id),
+                    'difficulties': counts.get(category_id, {})
+                } for category_id, category_type in self.categories().items()
+            },
+            'difficulties': difficulties
+        }
+
+    def select_questions(self):
+        return self.session.query(*QUESTION_FIELDS)
+
+    def question_page(self, page=1, after_id=None):
+        if self.question_store is not None:
+            if after_id is None and page < 1:
+                return []
+            return self.question_store.page(
+                offset=(page - 1) * QUESTIONS_PER_PAGE, after_id=after_id,
+                limit=QUESTIONS_PER_PAGE)
+        return paginate_query(self.select_questions().order_by(Question.id),
+                              Question, page=page, after_id=after_id,
+                              per_page=QUESTIONS_PER_PAGE)
+
+    def question_cursor_page(self, after_id=None):
+        if self.question_store is not None:
+            return cursor_page(self.question_store.page(
+                after_id=after_id, limit=QUESTIONS_PER_PAGE + 1),
+                QUESTIONS_PER_PAGE)
+        return paginate_cursor(self.select_questions(), Question,
+                               after_id=after_id, per_page=QUESTIONS_PER_PAGE)
+
+    def category_questions(self, category_id):
+        if self.question_store is not None:
+            return self.question_store.page(category=category_id)
+        return (self.select_questions()
+                .filter(Question.category == category_id)
+                .order_by(Question.id)
+                .all())
+
+    def category_cursor_page(self, category_id, after_id=None):
+        # Returns (rows, next_cursor, total questions in the category)
+        if self.question_store is not None:
+            rows, next_cursor = cursor_page(self.question_store.page(
+                category=category_id, after_id=after_id,
+                limit=QUESTIONS_PER_PAGE + 1), QUESTIONS_PER_PAGE)
+            return rows, next_cursor, self.total_questions(category_id)
+        query = self.select_questions().filter(
+            Question.category == category_id)
+        rows, next_cursor = paginate_cursor(
+            query, Question, after_id=after_id, per_page=QUESTIONS_PER_PAGE)
+        return rows, next_cursor, self.total_questions(category_id)
+
+    def fetch_rows(self, question_ids):
+        # Question rows of the given ids, in their order
+        if self.question_store is not None:
+            return self.question_store.fetch(question_ids)
+        return fetch_question_rows(question_ids)
+
+    def load_question(self, question_id):
+        rows = self.fetch_rows([question_id])
+        return QuestionRecord.from_row(rows[0]) if rows else None
+
+    def search_questions(self, term, include_answers=False, page=1):
+        if self.question_store is not None:
+            search = self.question_store
+        elif self.db.engine.dialect.name == 'postgresql':
+            search = self.postgres_search
+        else:
+            search = self.indexed_search
+        return search.search(term, include_answers=include_answers,
+                             page=page, per_page=QUESTIONS_PER_PAGE)
+
+    def suggest(self, prefix, limit=10):
+        return self.suggestions.complete(prefix, limit=limit)
+
+    def export_rows(self, category_id=None):
+        return export.export_rows(category_id)
+
+    def create_question(self, question, answer, category, difficulty):
+        created = Question(question=question, answer=answer,
+                           category=category, difficulty=difficulty)
+        self.session.add(created)
+        self.session.commit()
+        self.question_created(created)
+        return created
+
+    def delete_question(self, question_id):
+        # Returns the deleted question, or None when there is none
+        question = self.session.query(Question).get(question_id)
+        if question is None:
+            return None
+        self.session.delete(question)
+        self.session.commit()
+        self.question_deleted(question)
+        return question
+
+    def delete_questions(self, question_ids, filters, dry_run, batch_size):
+        result = batch.delete_questions(question_ids, filters,
+                                        dry_run=dry_run,
+                                        batch_size=batch_size)
+        if result['deleted']:
+            self.questions_changed()
+        return result
+
+    def import_questions(self, rows, batch_size):
+        result = ingest.import_questions(rows, batch_size=batch_size,
+                                         categories=self.categories())
+        if result['inserted']:
+            self.questions_changed()
+        return result
+
+    # --- Quizzes
+
+    def next_quiz_question(self, previous_questions, category_id=None,
+                           strategy=draw_uniform, options=None):
+        questions = self.next_quiz_questions(
+            previous_questions, 1, category_id, strategy, options)
+        return questions[0] if questions else None
+
+    def next_quiz_questions(self, previous_questions, count, category_id=None,
+                            strategy=draw_uniform, options=None):
+        # Up to count distinct unseen questions, drawn from the id index
+        # and loaded with one query per round
+        questions, seen = [], set(previous_questions)
+        while len(questions) < count:
+            question_ids = draw_many(strategy, self.question_ids, category_id,
+                                     seen, count - len(questions),
+                                     options or {})
+            if not question_ids:
+                break
+            seen.update(question_ids)
+            rows = self.fetch_rows(question_ids)
+            loaded = {row.id for row in rows}
+            missing = [question_id for question_id in question_ids
+                       if question_id not in loaded]
+            if missing:
+                # A lagging replica may not have them yet, only ids the
+                # primary lacks too were deleted since the index loaded
+                with primary_reads():
+                    rows = list(rows) + self.fetch_rows(missing)
+                loaded = {row.id for row in rows}
+                for question_id in missing:
+                    if question_id not in loaded:
+                        self.question_ids.discard(question_id)
+            questions.extend(QuestionRecord.from_row(row).format()
+                             for row in rows)
+        return questions
+
+    def start_quiz_session(self, category_id=None):
+        # Returns the new session id and the number of questions to play
+        session_id = new_session_id()
+        session = new_session(category_id)
+        self.quiz_sessions.put(session_id, session)
+        return session_id, remaining_in_session(session, self.question_ids)
+
+    def next_session_question(self, session_id):
+        # Returns (question, remaining questions), or None for an unknown
+        # session; questions deleted since they were indexed are skipped
+        with self.session_locks(session_id):
+            session = self.quiz_sessions.get(session_id)
+            if session is None:
+                return None
+            next_question = None
+            question_id = draw_from_session(session, self.question_ids)
+            while question_id is not None:
+                question = self.load_question(question_id)
+                if question is None:
+                    with primary_reads():
+                        question = self.load_question(question_id)
+                if question is not None:
+                    next_question = question.format()
+                    break
+                question_id = draw_from_session(session, self.question_ids)
+            self.quiz_sessions.put(session_id, session)
+        return next_question, remaining_in_session(session, self.question_ids)
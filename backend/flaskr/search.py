@@ -0,0 +1,213 @@
+import bisect
+import re
+import threading
+import time
+from collections import defaultdict
+
+from sqlalchemy import func, literal_column
+
+TOKEN_PATTERN = re.compile(r'\w+')
+
+# Must match the expression of the GIN indexes created in models.py
+SEARCH_CONFIG = literal_column("'english'")
+
+
+def tokenize(text):
+    return TOKEN_PATTERN.findall((text or '').lower())
+
+
+"""
+PostgresQuestionSearch
+    full-text search over to_tsvector('english', ...) expressions that
+    are backed by GIN indexes. Every search term is matched as a word
+    prefix, so "tit" still finds "title", results are ranked with
+    ts_rank and only the requested page is loaded, as column rows.
+    Terms made only of stop words ("the", "who") give an empty tsquery
+    and fall back to an ILIKE substring match, as the other backends
+    would still match them.
+"""
+
+
+class PostgresQuestionSearch:
+
+    def __init__(self, session, model, columns):
+        self.session = session
+        self.model = model
+        self.columns = columns
+
+    def ts_query(self, tokens):
+        return func.to_tsquery(
+            SEARCH_CONFIG, ' & '.join(f'{token}:*' for token in tokens))
+
+    def search(self, term, include_answers=False, page=1, per_page=10):
+        tokens = tokenize(term)
+        if not tokens or page < 1:
+            return 0, []
+        query = self.ts_query(tokens)
+
+        question_vector = func.to_tsvector(SEARCH_CONFIG, self.model.question)
+        match = question_vector.op('@@')(query)
+        rank = func.ts_rank(question_vector, query)
+        if include_answers:
+            answer_vector = func.to_tsvector(SEARCH_CONFIG, self.model.answer)
+            match = match | answer_vector.op('@@')(query)
+            rank = rank + func.ts_rank(answer_vector, query)
+        order = (rank.desc(), self.model.id)
+
+        total = (self.session
+                 .query(func.count(self.model.id))
+                 .filter(match)
+                 .scalar())
+        if not total and self.session.query(func.numnode(query) == 0).scalar():
+            # Every term is a stop word, so match them as a substring
+            pattern = '%' + re.sub(r'([\\%_])', r'\\\1', term.strip()) + '%'
+            match = self.model.question.ilike(pattern, escape='\\')
+            if include_answers:
+                match = match | self.model.answer.ilike(pattern, escape='\\')
+            order = (self.model.id,)
+            total = (self.session
+                     .query(func.count(self.model.id))
+                     .filter(match)
+                     .scalar())
+        questions = (self.session
+                     .query(*self.columns)
+                     .filter(match)
+                     .order_by(*order)
+                     .offset((page - 1) * per_page)
+                     .limit(per_page)
+                     .all())
+        return total, questions
+
+
+"""
+InvertedIndexQuestionSearch
+    in-process fallback for SQLite and test deployments. Keeps token
+    postings (id -> term frequency) for questions and answers plus a
+    sorted vocabulary, so prefix terms are resolved with bisect. Ranking
+    sums term frequencies, mirroring the Postgres backend closely enough
+    for development use.
+"""
+
+
+class InvertedIndexQuestionSearch:
+
+    def __init__(self, load, fetch, ttl=300):
+        self.load = load
+        self.fetch = fetch
+        self.ttl = ttl
+        self.lock = threading.Lock()
+        self.postings = None
+        self.documents = {}
+        self.vocabulary = {}
+        self.expires_at = 0
+
+    def stale(self):
+        return self.postings is None or time.monotonic() >= self.expires_at
+
+    def refresh_if_stale(self):
+        # Callers must hold self.lock
+        if self.stale():
+            self.rebuild_unlocked(self.load())
+
+    def rebuild(self, rows):
+        with self.lock:
+            self.rebuild_unlocked(rows)
+
+    def rebuild_unlocked(self, rows):
+        self.postings = {'question': defaultdict(dict),
+                         'answer': defaultdict(dict)}
+        self.documents = {}
+        for question_id, question, answer in rows:
+            self.index(question_id, question, answer)
+        self.vocabulary = {field: sorted(postings)
+                           for field, postings in self.postings.items()}
+        self.expires_at = time.monotonic() + self.ttl
+
+    def index(self, question_id, question, answer):
+        # Callers must hold self.lock
+        fields = {'question': tokenize(question), 'answer': tokenize(answer)}
+        self.documents[question_id] = fields
+        for field, tokens in fields.items():
+            for token in tokens:
+                postings = self.postings[field][token]
+                postings[question_id] = postings.get(question_id, 0) + 1
+
+    def add(self, question_id, question, answer):
+        with self.lock:
+            if self.postings is None:
+                return
+            self.discard_unlocked(question_id)
+            self.index(question_id, question, answer)
+            for field, tokens in self.documents[question_id].items():
+                vocabulary = self.vocabulary[field]
+                for token in set(tokens):
+                    position = bisect.bisect_left(vocabulary, token)
+                    if position == len(vocabulary) or \
+                            vocabulary[position] != token:
+                        vocabulary.insert(position, token)
+
+    def discard(self, question_id):
+        with self.lock:
+            if self.postings is None:
+                return
+            self.discard_unlocked(question_id)
+
+    def discard_unlocked(self, question_id):
+        fields = self.documents.pop(question_id, None)
+        if fields is None:
+            return
+        for field, tokens in fields.items():
+            for token in set(tokens):
+                postings = self.postings[field][token]
+                postings.pop(question_id, None)
+                if not postings:
+                    del self.postings[field][token]
+                    vocabulary = self.vocabulary[field]
+                    del vocabulary[bisect.bisect_left(vocabulary, token)]
+
+    def invalidate(self):
+        with self.lock:
+            self.postings = None
+
+    def prefix_scores(self, field, prefix):
+        # Callers must hold self.lock
+        scores = defaultdict(int)
+        vocabulary = self.vocabulary[field]
+        position = bisect.bisect_left(vocabulary, prefix)
+        while position < len(vocabulary) and \
+                vocabulary[position].startswith(prefix):
+            token = vocabulary[position]
+            for question_id, frequency in self.postings[field][token].items():
+                scores[question_id] += frequency
+            position += 1
+        return scores
+
+    def rank(self, tokens, include_answers):
+        fields = ['question', 'answer'] if include_answers else ['question']
+        with self.lock:
+            self.refresh_if_stale()
+            ranked = None
+            for token in tokens:
+                scores = defaultdict(int)
+                for field in fields:
+                    for question_id, score in \
+                            self.prefix_scores(field, token).items():
+                        scores[question_id] += score
+                if ranked is None:
+                    ranked = scores
+                else:
+                    ranked = {question_id: ranked[question_id] + score
+                              for question_id, score in scores.items()
+                              if question_id in ranked}
+                if not ranked:
+                    return []
+        return sorted(ranked, key=lambda question_id:
+                      (-ranked[question_id], question_id))
+
+    def search(self, term, include_answers=False, page=1, per_page=10):
+        tokens = tokenize(term)
+        if not tokens or page < 1:
+            return 0, []
+        ranked_ids = self.rank(tokens, include_answers)
+        start = (page - 1) * per_page
+        return len(ranked_ids), self.fetch(ranked_ids[start:start + per_page])
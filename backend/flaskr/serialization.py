@@ -0,0 +1,102 @@
+import json
+from json.encoder import encode_basestring
+
+from flask import Response
+
+from settings import JSON_PROVIDER
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+"""
+JSON providers
+    orjson is used when it is installed and JSON_PROVIDER allows it,
+    otherwise the stdlib encoder. Both sort keys and accept the integer
+    keys of the categories map, matching what flask.jsonify produced.
+"""
+
+
+class StdlibJSONProvider:
+    name = 'json'
+
+    def dumps(self, payload):
+        return json.dumps(payload, sort_keys=True,
+                          separators=(',', ':')).encode()
+
+
+class OrjsonJSONProvider:
+    name = 'orjson'
+
+    def dumps(self, payload):
+        return orjson.dumps(
+            payload, option=orjson.OPT_SORT_KEYS | orjson.OPT_NON_STR_KEYS)
+
+
+def get_json_provider(name='auto'):
+    if name == 'orjson' and orjson is None:
+        raise RuntimeError('JSON_PROVIDER is orjson but it is not installed')
+    if name in ('auto', 'orjson') and orjson is not None:
+        return OrjsonJSONProvider()
+    return StdlibJSONProvider()
+
+
+default_provider = get_json_provider(JSON_PROVIDER)
+
+
+"""
+JSONFragment
+    already encoded JSON that json_response splices into the top level
+    of a payload as is, e.g. a question list encoded by encode_questions
+"""
+
+
+class JSONFragment(bytes):
+    pass
+
+
+def json_response(payload, status=200, provider=None):
+    provider = provider or default_provider
+    fragments = {key: value for key, value in payload.items()
+                 if isinstance(value, JSONFragment)}
+    if not fragments:
+        body = provider.dumps(payload)
+    else:
+        members = [provider.dumps(str(key)) + b':' + (
+                   fragments[key] if key in fragments
+                   else provider.dumps(payload[key]))
+                   for key in sorted(payload, key=str)]
+        body = b'{' + b','.join(members) + b'}'
+    return Response(body + b'\n', status=status, mimetype='application/json')
+
+
+"""
+encode_questions(rows)
+    row-to-JSON fast path: renders (id, question, answer, category,
+    difficulty) rows, e.g. SQLAlchemy Core rows, straight into a JSON
+    array through a string template and the C string escaper. No ORM
+    objects or per-row dicts are built; rows the template cannot render
+    (NULLs, non-integer categories) fall back to the generic encoder.
+"""
+
+QUESTION_COLUMNS = ('id', 'question', 'answer', 'category', 'difficulty')
+QUESTION_TEMPLATE = ('{"answer":%s,"category":%d,"difficulty":%d,'
+                     '"id":%d,"question":%s}')
+
+
+def encode_question_row(row):
+    question_id, question, answer, category, difficulty = row
+    try:
+        return QUESTION_TEMPLATE % (
+            encode_basestring(answer), category, difficulty,
+            question_id, encode_basestring(question))
+    except TypeError:
+        return json.dumps(dict(zip(QUESTION_COLUMNS, row)), sort_keys=True,
+                          separators=(',', ':'))
+
+
+def encode_questions(rows):
+    return JSONFragment(
+        ('[' + ','.join([encode_question_row(row) for row in rows]) + ']')
+        .encode())
@@ -0,0 +1,112 @@
+import secrets
+import threading
+import time
+from collections import OrderedDict
+
+"""
+Quiz sessions
+    a session is a plain dict holding its category and the ids drawn so
+    far. Questions are drawn from the shared QuestionIdIndex, excluding
+    those ids, so a session costs memory in proportion to the questions
+    played rather than to the size of the category, and questions
+    created or deleted meanwhile are picked up. Drawing does work in
+    proportion to the questions played.
+
+    Any object with get(session_id), put(session_id, session) and
+    delete(session_id) can be used as the session store. Draws that read
+    and write back the same session must hold its lock from
+    SessionLocks, or two of them could deal the same question.
+"""
+
+
+def new_session(category_id=None):
+    return {
+        'drawn': [],
+        'category': category_id
+    }
+
+
+def draw_from_session(session, index):
+    question_id = index.draw(session['category'],
+                             exclude=set(session['drawn']))
+    if question_id is not None:
+        session['drawn'].append(question_id)
+    return question_id
+
+
+def remaining_in_session(session, index):
+    return index.count_unseen(session['category'],
+                              exclude=session['drawn'])
+
+
+def new_session_id():
+    return secrets.token_urlsafe(16)
+
+
+"""
+SessionLocks
+    a fixed set of locks that session ids are hashed onto, so every
+    session has a lock without one being kept per session
+"""
+
+
+class SessionLocks:
+
+    def __init__(self, stripes=64):
+        self.locks = [threading.Lock() for _ in range(stripes)]
+
+    def __call__(self, session_id):
+        return self.locks[hash(session_id) % len(self.locks)]
+
+
+"""
+InMemorySessionStore
+    process-local session store with a sliding TTL. Entries are kept in
+    least recently used order so expired sessions are evicted from the
+    front on every access, and the oldest ones go first when the store
+    reaches max_sessions.
+"""
+
+
+class InMemorySessionStore:
+
+    def __init__(self, ttl=1800, max_sessions=10000):
+        self.ttl = ttl
+        self.max_sessions = max_sessions
+        self.lock = threading.Lock()
+        self.sessions = OrderedDict()
+
+    def evict_expired(self, now):
+        # Callers must hold self.lock
+        while self.sessions:
+            session_id, (expires_at, _) = next(iter(self.sessions.items()))
+            if expires_at > now:
+                break
+            del self.sessions[session_id]
+
+    def get(self, session_id):
+        with self.lock:
+            now = time.monotonic()
+            self.evict_expired(now)
+            entry = self.sessions.get(session_id)
+            if entry is None:
+                return None
+            self.sessions[session_id] = (now + self.ttl, entry[1])
+            self.sessions.move_to_end(session_id)
+            return entry[1]
+
+    def put(self, session_id, session):
+        with self.lock:
+            now = time.monotonic()
+            self.evict_expired(now)
+            self.sessions[session_id] = (now + self.ttl, session)
+            self.sessions.move_to_end(session_id)
+            while len(self.sessions) > self.max_sessions:
+                self.sessions.popitem(last=False)
+
+    def delete(self, session_id):
+        with self.lock:
+            self.sessions.pop(session_id, None)
+
+    def __len__(self):
+        return len(self.sessions)
@@ -0,0 +1,243 @@
+import bisect
+import sys
+import threading
+import time
+from array import array
+from collections import namedtuple
+
+from .serialization import QUESTION_COLUMNS
+
+QuestionRow = namedtuple('QuestionRow', QUESTION_COLUMNS)
+
+# Stands in for NULL categories and difficulties in the integer columns
+NULL = -2 ** 63
+
+# Separates rows in the lower-cased search text, never part of a term
+ROW_SEPARATOR = '\x00'
+
+
+def to_column(value):
+    return NULL if value is None else value
+
+
+def from_column(value):
+    return None if value == NULL else value
+
+
+def intern_text(value):
+    return sys.intern(value) if type(value) is str else value
+
+
+"""
+ColumnarQuestionStore
+    the question table held in process, column by column: ids,
+    categories and difficulties in typed arrays, sorted by id, and the
+    question and answer texts as lists of interned strings. Listing,
+    category pages, lookups by id and substring search are served from
+    it without a query.
+
+    Writes go through the database first and are then applied with
+    add() and discard(). Every check_interval seconds a read compares
+    version(), the (count, max id) of the table, with the same pair of
+    the store and reloads it on a mismatch, which picks up inserts and
+    deletes made by other processes. Bulk writes and category changes
+    call invalidate(). In-place changes made by another process, such
+    as questions moved off a deleted category, are not visible to that
+    check: a change channel delivers them, and without one the store
+    is reloaded once `ttl` seconds pass.
+"""
+
+
+class ColumnarQuestionStore:
+
+    def __init__(self, load, version, check_interval=5, ttl=300):
+        self.load = load
+        self.version = version
+        self.check_interval = check_interval
+        self.ttl = ttl
+        self.expires_at = 0
+        self.lock = threading.Lock()
+        self.ids = None
+        self.categories = None
+        self.difficulties = None
+        self.questions = []
+        self.answers = []
+        self.by_category = {}
+        self.search_text = {}
+        self.checked_at = 0
+
+    def stale(self):
+        return self.ids is None or time.monotonic() >= self.expires_at
+
+    def fingerprint(self):
+        # Callers must hold self.lock
+        return len(self.ids), self.ids[-1] if self.ids else None
+
+    def refresh_if_stale(self):
+        # Callers must hold self.lock
+        if self.stale():
+            self.rebuild_unlocked(self.load())
+        elif time.monotonic() >= self.checked_at + self.check_interval:
+            if tuple(self.version()) != self.fingerprint():
+                self.rebuild_unlocked(self.load())
+            self.checked_at = time.monotonic()
+
+    def build(self):
+        with self.lock:
+            self.refresh_if_stale()
+
+    def rebuild(self, rows):
+        with self.lock:
+            self.rebuild_unlocked(rows)
+
+    def rebuild_unlocked(self, rows):
+        rows = sorted(rows, key=lambda row: row[0])
+        self.ids = array('q', [row[0] for row in rows])
+        self.questions = [intern_text(row[1]) for row in rows]
+        self.answers = [intern_text(row[2]) for row in rows]
+        self.categories = array('q', [to_column(row[3]) for row in rows])
+        self.difficulties = array('q', [to_column(row[4]) for row in rows])
+        self.by_category = {}
+        for question_id, category in zip(self.ids, self.categories):
+            self.by_category.setdefault(category, array('q')).append(
+                question_id)
+        self.search_text = {}
+        self.checked_at = time.monotonic()
+        self.expires_at = self.checked_at + self.ttl
+
+    def invalidate(self):
+        with self.lock:
+            self.ids = None
+
+    def add(self, question_id, question, answer, category, difficulty):
+        with self.lock:
+            if self.ids is None:
+                return
+            position = bisect.bisect_left(self.ids, question_id)
+            if position < len(self.ids) and self.ids[position] == question_id:
+                self.remove(position)
+            category = to_column(category)
+            self.ids.insert(position, question_id)
+            self.questions.insert(position, intern_text(question))
+            self.answers.insert(position, intern_text(answer))
+            self.categories.insert(position, category)
+            self.difficulties.insert(position, to_column(difficulty))
+            category_ids = self.by_category.setdefault(category, array('q'))
+            category_ids.insert(
+                bisect.bisect_left(category_ids, question_id), question_id)
+            self.search_text = {}
+
+    def discard(self, question_id):
+        with self.lock:
+            if self.ids is None:
+                return
+            position = bisect.bisect_left(self.ids, question_id)
+            if position < len(self.ids) and self.ids[position] == question_id:
+                self.remove(position)
+                self.search_text = {}
+
+    def remove(self, position):
+        # Callers must hold self.lock
+        category_ids = self.by_category[self.categories[position]]
+        del category_ids[bisect.bisect_left(category_ids,
+                                            self.ids[position])]
+        for column in (self.ids, self.questions, self.answers,
+                       self.categories, self.difficulties):
+            del column[position]
+
+    def row(self, position):
+        # Callers must hold self.lock
+        return QuestionRow(self.ids[position], self.questions[position],
+                           self.answers[position],
+                           from_column(self.categories[position]),
+                           from_column(self.difficulties[position]))
+
+    def rows_by_id(self, question_ids):
+        # Callers must hold self.lock
+        rows = []
+        for question_id in question_ids:
+            position = bisect.bisect_left(self.ids, question_id)
+            if position < len(self.ids) and self.ids[position] == question_id:
+                rows.append(self.row(position))
+        return rows
+
+    def page(self, category=None, offset=0, after_id=None, limit=None):
+        # Rows ordered by id, of one category when given, starting after
+        # after_id, or else at offset
+        with self.lock:
+            self.refresh_if_stale()
+            if category is not None:
+                ids = self.by_category.get(to_column(category), array('q'))
+            else:
+                ids = self.ids
+            if after_id is not None:
+                offset = bisect.bisect_right(ids, after_id)
+            end = len(ids) if limit is None else offset + limit
+            if ids is self.ids:
+                return [self.row(position) for position
+                        in range(offset, min(end, len(ids)))]
+            return self.rows_by_id(ids[offset:end])
+
+    def fetch(self, question_ids):
+        # Rows of the given ids in their order, leaving out unknown ids
+        with self.lock:
+            self.refresh_if_stale()
+            return self.rows_by_id(question_ids)
+
+    def id_rows(self):
+        # (id, category, difficulty) rows, as the quiz id index loads them
+        with self.lock:
+            self.refresh_if_stale()
+            return [(question_id, from_column(category),
+                     from_column(difficulty))
+                    for question_id, category, difficulty
+                    in zip(self.ids, self.categories, self.difficulties)]
+
+    def count(self, category=None):
+        with self.lock:
+            self.refresh_if_stale()
+            if category is None:
+                return len(self.ids)
+            return len(self.by_category.get(to_column(category), ()))
+
+    def haystack(self, field):
+        # Callers must hold self.lock. The lower-cased texts of a column
+        # joined into one string, with the offset each row starts at, so
+        # a search is a run of str.find calls; rebuilt after writes
+        if field not in self.search_text:
+            texts = self.questions if field == 'question' else self.answers
+            lowered = [(text or '').lower() for text in texts]
+            starts, offset = array('q'), 0
+            for text in lowered:
+                starts.append(offset)
+                offset += len(text) + 1
+            self.search_text[field] = (ROW_SEPARATOR.join(lowered), starts)
+        return self.search_text[field]
+
+    def matches(self, field, term):
+        # Callers must hold self.lock
+        text, starts = self.haystack(field)
+        positions, offset = [], text.find(term)
+        while offset != -1:
+            position = bisect.bisect_right(starts, offset) - 1
+            positions.append(position)
+            if position + 1 == len(starts):
+                break
+            offset = text.find(term, starts[position + 1])
+        return positions
+
+    def search(self, term, include_answers=False, page=1, per_page=10):
+        # Case-insensitive substring search, returns (total, rows) with
+        # the rows of one page in id order
+        term = (term or '').lower().replace(ROW_SEPARATOR, '').strip()
+        if not term or page < 1:
+            return 0, []
+        with self.lock:
+            self.refresh_if_stale()
+            positions = self.matches('question', term)
+            if include_answers:
+                positions = sorted(set(positions).union(
+                    self.matches('answer', term)))
+            start = (page - 1) * per_page
+            return len(positions), [self.row(position) for position
+                                    in positions[start:start + per_page]]
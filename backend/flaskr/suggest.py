@@ -0,0 +1,201 @@
+import bisect
+import contextlib
+import heapq
+import logging
+import threading
+import time
+from collections import defaultdict
+
+from .search import tokenize
+
+logger = logging.getLogger(__name__)
+
+# Prefixes up to this length keep their best completions precomputed, the
+# runs of longer prefixes are short enough to rank per request
+TOP_PREFIX_LENGTH = 3
+# Completions kept per prefix, and the most one request gets
+MAX_SUGGESTIONS = 50
+# Sorts after every character a token can end with
+LAST_CHARACTER = chr(0x10ffff)
+
+"""
+PrefixIndex
+    sorted array of the distinct question tokens plus a document
+    frequency per token. Completions for a prefix are the contiguous run
+    of tokens found with bisect, ranked by how many questions use them.
+    The runs of one- to three-letter prefixes span much of the
+    vocabulary, so their top MAX_SUGGESTIONS terms are kept ranked and
+    patched as questions come and go. Only the first load happens in a
+    request; once the TTL expires, or after invalidate(), the index is
+    rebuilt in a background thread, inside context(), while the old one
+    keeps serving.
+"""
+
+
+class PrefixIndex:
+
+    def __init__(self, load, ttl=300, context=contextlib.nullcontext):
+        self.load = load
+        self.ttl = ttl
+        self.context = context
+        self.lock = threading.Lock()
+        self.terms = None
+        self.frequencies = {}
+        self.documents = {}
+        self.top = {}
+        self.expires_at = 0
+        # Bumped by every write, so a rebuild can tell it missed some
+        self.generation = 0
+        self.refresher = None
+
+    def stale(self):
+        return self.terms is None or time.monotonic() >= self.expires_at
+
+    def refresh_if_stale(self):
+        # Callers must hold self.lock
+        if self.terms is None:
+            self.rebuild_unlocked(self.load())
+        elif self.stale() and self.refresher is None:
+            self.refresher = threading.Thread(target=self.refresh,
+                                              daemon=True)
+            self.refresher.start()
+
+    def refresh(self):
+        with self.lock:
+            generation = self.generation
+        fresh = PrefixIndex(None, ttl=self.ttl)
+        try:
+            with self.context():
+                rows = self.load()
+            fresh.rebuild_unlocked(rows)
+        except Exception:
+            logger.exception('could not rebuild the suggestion index')
+        with self.lock:
+            self.refresher = None
+            # Writes made during the load stay stale for the next refresh
+            if fresh.terms is not None and generation == self.generation:
+                self.swap(fresh)
+
+    def swap(self, fresh):
+        # Callers must hold self.lock
+        self.terms, self.frequencies = fresh.terms, fresh.frequencies
+        self.documents, self.top = fresh.documents, fresh.top
+        self.expires_at = fresh.expires_at
+
+    def rebuild(self, rows):
+        with self.lock:
+            self.rebuild_unlocked(rows)
+
+    def rebuild_unlocked(self, rows):
+        self.frequencies, self.documents = {}, {}
+        for question_id, question in rows:
+            self.index(question_id, question)
+        self.terms = sorted(self.frequencies)
+        ranked = defaultdict(list)
+        for term in self.terms:
+            for prefix in short_prefixes(term):
+                ranked[prefix].append(term)
+        self.top = {prefix: heapq.nsmallest(MAX_SUGGESTIONS, terms,
+                                            key=self.ranking)
+                    for prefix, terms in ranked.items()}
+        self.expires_at = time.monotonic() + self.ttl
+
+    def ranking(self, term):
+        return -self.frequencies.get(term, 0), term
+
+    def index(self, question_id, question):
+        # Callers must hold self.lock
+        tokens = set(tokenize(question))
+        self.documents[question_id] = tokens
+        for token in tokens:
+            self.frequencies[token] = self.frequencies.get(token, 0) + 1
+
+    def build(self):
+        with self.lock:
+            self.refresh_if_stale()
+
+    def add(self, question_id, question):
+        with self.lock:
+            if self.terms is None:
+                return
+            self.generation += 1
+            self.discard_unlocked(question_id)
+            tokens = set(tokenize(question))
+            self.documents[question_id] = tokens
+            for token in tokens:
+                if token not in self.frequencies:
+                    self.frequencies[token] = 0
+                    bisect.insort(self.terms, token)
+                self.frequencies[token] += 1
+                self.promote(token)
+
+    def discard(self, question_id):
+        with self.lock:
+            if self.terms is None:
+                return
+            self.generation += 1
+            self.discard_unlocked(question_id)
+
+    def discard_unlocked(self, question_id):
+        for token in self.documents.pop(question_id, ()):
+            self.frequencies[token] -= 1
+            if self.frequencies[token] == 0:
+                del self.frequencies[token]
+                del self.terms[bisect.bisect_left(self.terms, token)]
+            self.demote(token)
+
+    def promote(self, term):
+        # Callers must hold self.lock; term is used by one more question
+        for prefix in short_prefixes(term):
+            top = self.top.setdefault(prefix, [])
+            if term in top:
+                top.remove(term)
+            self.insert(top, term)
+            del top[MAX_SUGGESTIONS:]
+
+    def demote(self, term):
+        # Callers must hold self.lock; term is used by one question less
+        for prefix in short_prefixes(term):
+            top = self.top.get(prefix, [])
+            if term not in top:
+                continue
+            if len(top) == MAX_SUGGESTIONS:
+                # Terms outside the list may now rank above term
+                top[:] = self.scan(prefix, MAX_SUGGESTIONS)
+            else:
+                # The list holds the whole run
+                top.remove(term)
+                if term in self.frequencies:
+                    self.insert(top, term)
+            if not top:
+                del self.top[prefix]
+
+    def insert(self, top, term):
+        rankings = [self.ranking(other) for other in top]
+        top.insert(bisect.bisect(rankings, self.ranking(term)), term)
+
+    def scan(self, prefix, limit):
+        # Callers must hold self.lock
+        start = bisect.bisect_left(self.terms, prefix)
+        end = bisect.bisect_left(self.terms, prefix + LAST_CHARACTER, start)
+        return heapq.nsmallest(limit, self.terms[start:end],
+                               key=self.ranking)
+
+    def invalidate(self):
+        with self.lock:
+            self.generation += 1
+            self.expires_at = 0
+
+    def complete(self, prefix, limit=10):
+        prefix = prefix.lower()
+        limit = min(limit, MAX_SUGGESTIONS)
+        with self.lock:
+            self.refresh_if_stale()
+            if 0 < len(prefix) <= TOP_PREFIX_LENGTH:
+                return self.top.get(prefix, [])[:limit]
+            return self.scan(prefix, limit)
+
+
+def short_prefixes(term):
+    return [term[:length]
+            for length in range(1, min(len(term), TOP_PREFIX_LENGTH) + 1)]
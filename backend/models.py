@@ -1,12 +1,41 @@
+import contextlib
+import functools
+import itertools
 import os
-from sqlalchemy import Column, String, Integer, create_engine
-from flask_sqlalchemy import SQLAlchemy
+import threading
+import time
+from flask import g, has_app_context
+from sqlalchemy import (
+    Column,
+    String,
+    Integer,
+    ForeignKey,
+    Index,
+    create_engine,
+    event,
+    DDL
+)
+from sqlalchemy.pool import QueuePool
+from sqlalchemy import orm
+from flask_sqlalchemy import SQLAlchemy, SignallingSession
 import json
 
 from settings import (
     DB_USER,
     DB_PASSWORD,
-    DB_NAME
+    DB_NAME,
+    DB_HOST,
+    DB_PORT,
+    DB_POOL_SIZE,
+    DB_MAX_OVERFLOW,
+    DB_POOL_TIMEOUT,
+    DB_POOL_RECYCLE,
+    DB_POOL_PRE_PING,
+    DB_STATEMENT_TIMEOUT,
+    DB_QUERY_CACHE_SIZE,
+    DB_REPLICA_URLS,
+    DB_REPLICA_BALANCING,
+    DB_READ_YOUR_WRITES_SECONDS
 )
 
 # refactor db path
@@ -14,19 +43,230 @@ database_user = DB_USER
 database_password = DB_PASSWORD
 database_name = DB_NAME
 database_path = 'postgresql://{}:{}@{}/{}'.format(
-    database_user, database_password, 'localhost:5432', database_name)
+    database_user, database_password, f'{DB_HOST}:{DB_PORT}', database_name)
+
+
+"""
+ReplicaRouter
+    picks a read replica engine for read-only requests, either round
+    robin or the replica with the fewest checked out connections. For
+    DB_READ_YOUR_WRITES_SECONDS after a write committed in this process,
+    reads stay on the primary so clients see their own changes.
+"""
+
+
+class ReplicaRouter:
+
+    def __init__(self, engines=(), balancing='round_robin',
+                 read_your_writes=5.0):
+        self.engines = list(engines)
+        self.balancing = balancing
+        self.read_your_writes = read_your_writes
+        self.turns = itertools.count()
+        self.last_write = float('-inf')
+
+    def record_write(self):
+        self.last_write = time.monotonic()
+
+    def choose(self):
+        if not self.engines:
+            return None
+        if time.monotonic() - self.last_write < self.read_your_writes:
+            return None
+        if self.balancing == 'least_connections':
+            return min(self.engines, key=checked_out_connections)
+        return self.engines[next(self.turns) % len(self.engines)]
+
+    def dispose(self):
+        for engine in self.engines:
+            engine.dispose()
+
+
+def checked_out_connections(engine):
+    checkedout = getattr(engine.pool, 'checkedout', None)
+    return checkedout() if checkedout else 0
+
+
+"""
+read_only(view)
+    marks a view, or the rest of the current request with use_replica(),
+    as safe to serve from a read replica. Reads inside primary_reads()
+    go to the primary regardless, e.g. to load a process-wide index that
+    a lagging replica would leave behind for its whole TTL.
+"""
+
+
+def use_replica():
+    g.use_replica = True
+
+
+def read_only(view):
+    @functools.wraps(view)
+    def wrapper(*args, **kwargs):
+        use_replica()
+        return view(*args, **kwargs)
+    return wrapper
+
+
+@contextlib.contextmanager
+def primary_reads():
+    # Reads inside the block go to the primary, even in a read-only request
+    routed = has_app_context() and g.pop('use_replica', False)
+    try:
+        yield
+    finally:
+        if routed:
+            use_replica()
+
+
+"""
+RoutingSession
+    sends SELECTs of read-only requests to a replica and everything
+    else, including any statement issued while flushing, to the primary.
+    Committing a write starts the read-your-writes window.
+"""
+
+
+class RoutingSession(SignallingSession):
+
+    def get_bind(self, mapper=None, clause=None, **kwargs):
+        is_read = (clause is not None and clause.is_select
+                   and not self._flushing)
+        if not is_read:
+            self.info['wrote'] = True
+        elif has_app_context() and g.get('use_replica'):
+            router = self.app.extensions.get('replicas')
+            replica = router.choose() if router else None
+            if replica is not None:
+                return replica
+        return super().get_bind(mapper, clause)
+
+
+class RoutingSQLAlchemy(SQLAlchemy):
+
+    def create_session(self, options):
+        return orm.sessionmaker(class_=RoutingSession, db=self, **options)
+
+
+db = RoutingSQLAlchemy()
+
+
+@event.listens_for(RoutingSession, 'after_commit')
+def record_committed_write(session):
+    if session.info.pop('wrote', False):
+        router = session.app.extensions.get('replicas')
+        if router is not None:
+            router.record_write()
+
+
+@event.listens_for(RoutingSession, 'after_soft_rollback')
+def forget_rolled_back_write(session, previous_transaction):
+    session.info.pop('wrote', None)
+
+
+"""
+InstrumentedQueuePool
+    QueuePool that records how often connections are checked out and
+    how long callers waited for one, so pools can be sized per worker.
+    Read the numbers with pool_statistics(engine).
+"""
+
+
+class InstrumentedQueuePool(QueuePool):
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.statistics_lock = threading.Lock()
+        self.checkouts = 0
+        self.timeouts = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            connection = super()._do_get()
+        except Exception:
+            with self.statistics_lock:
+                self.timeouts += 1
+            raise
+        waited = time.perf_counter() - started
+        with self.statistics_lock:
+            self.checkouts += 1
+            self.total_wait += waited
+            self.max_wait = max(self.max_wait, waited)
+        return connection
+
+
+def pool_statistics(engine):
+    pool = engine.pool
+    statistics = {'pool': type(pool).__name__, 'status': pool.status()}
+    if isinstance(pool, QueuePool):
+        statistics.update({
+            'size': pool.size(),
+            'checked_in': pool.checkedin(),
+            'checked_out': pool.checkedout(),
+            'overflow': pool.overflow()
+        })
+    if isinstance(pool, InstrumentedQueuePool):
+        with pool.statistics_lock:
+            statistics.update({
+                'checkouts': pool.checkouts,
+                'timeouts': pool.timeouts,
+                'total_wait_seconds': round(pool.total_wait, 6),
+                'max_wait_seconds': round(pool.max_wait, 6)
+            })
+    return statistics
+
+
+"""
+engine_options(database_path)
+    SQLAlchemy engine options taken from settings.py. Pool options only
+    apply to server databases; SQLite keeps SQLAlchemy's defaults.
+    Postgres gets a per-connection statement_timeout, so every statement
+    of every request is bounded.
+"""
+
+
+def engine_options(database_path):
+    options = {'query_cache_size': DB_QUERY_CACHE_SIZE}
+    if database_path.startswith('sqlite'):
+        return options
+
+    options.update({
+        'poolclass': InstrumentedQueuePool,
+        'pool_size': DB_POOL_SIZE,
+        'max_overflow': DB_MAX_OVERFLOW,
+        'pool_timeout': DB_POOL_TIMEOUT,
+        'pool_recycle': DB_POOL_RECYCLE,
+        'pool_pre_ping': DB_POOL_PRE_PING
+    })
+    if database_path.startswith('postgresql') and DB_STATEMENT_TIMEOUT:
+        options['connect_args'] = {
+            'options': f'-c statement_timeout={DB_STATEMENT_TIMEOUT}'}
+    return options
 
-db = SQLAlchemy()
 
 """
 setup_db(app)
-    binds a flask application and a SQLAlchemy service
+    binds a flask application and a SQLAlchemy service, plus one engine
+    per read replica URL for the read-only endpoints
 """
 
 
-def setup_db(app, database_path=database_path):
+def setup_db(app, database_path=database_path, replica_paths=None):
     app.config["SQLALCHEMY_DATABASE_URI"] = database_path
     app.config["SQLALCHEMY_TRACK_MODIFICATIONS"] = False
+    app.config["SQLALCHEMY_ENGINE_OPTIONS"] = engine_options(database_path)
+    if replica_paths is None:
+        replica_paths = DB_REPLICA_URLS
+    if 'replicas' in app.extensions:
+        app.extensions['replicas'].dispose()
+    app.extensions['replicas'] = ReplicaRouter(
+        [create_engine(path, **engine_options(path))
+         for path in replica_paths],
+        balancing=DB_REPLICA_BALANCING,
+        read_your_writes=DB_READ_YOUR_WRITES_SECONDS)
     db.app = app
     db.init_app(app)
     db.create_all()
@@ -40,11 +280,16 @@ Question
 
 class Question(db.Model):
     __tablename__ = 'questions'
+    __table_args__ = (
+        Index('ix_questions_category_id', 'category', 'id'),
+        Index('ix_questions_difficulty', 'difficulty'),
+    )
 
     id = Column(Integer, primary_key=True)
     question = Column(String)
     answer = Column(String)
-    category = Column(String)
+    category = Column(Integer, ForeignKey(
+        'categories.id', onupdate='CASCADE', ondelete='SET NULL'))
     difficulty = Column(Integer)
 
     def __init__(self, question, answer, category, difficulty):
@@ -74,6 +319,22 @@ class Question(db.Model):
         }
 
 
+"""
+Full-text search indexes
+    GIN indexes over to_tsvector('english', ...) of the question and
+    answer text, created with the table on Postgres only. Existing
+    databases get them from trivia.psql.
+"""
+
+for column in ('question', 'answer'):
+    event.listen(
+        Question.__table__,
+        'after_create',
+        DDL(f"CREATE INDEX IF NOT EXISTS ix_questions_{column}_fts "
+            f"ON questions USING gin (to_tsvector('english', {column}))")
+        .execute_if(dialect='postgresql'))
+
+
 """
 Category
 
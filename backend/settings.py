@@ -1,4 +1,5 @@
 import os
+import tempfile
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -7,3 +8,79 @@ DB_USER = os.environ.get('DB_USER')
 DB_PASSWORD = os.environ.get('DB_PASSWORD')
 DB_NAME = os.environ.get('DB_NAME')
 TEST_DB_NAME = os.environ.get('TEST_DB_NAME')
+DB_HOST = os.environ.get('DB_HOST', 'localhost')
+DB_PORT = int(os.environ.get('DB_PORT', 5432))
+
+# Connection pool and engine tuning, see models.engine_options
+DB_POOL_SIZE = int(os.environ.get('DB_POOL_SIZE', 5))
+DB_MAX_OVERFLOW = int(os.environ.get('DB_MAX_OVERFLOW', 10))
+DB_POOL_TIMEOUT = int(os.environ.get('DB_POOL_TIMEOUT', 30))
+DB_POOL_RECYCLE = int(os.environ.get('DB_POOL_RECYCLE', 1800))
+DB_POOL_PRE_PING = os.environ.get('DB_POOL_PRE_PING', 'true') == 'true'
+# Milliseconds a single statement may run before Postgres cancels it (0=off)
+DB_STATEMENT_TIMEOUT = int(os.environ.get('DB_STATEMENT_TIMEOUT', 0))
+# Comma separated database URLs of read replicas for read-only endpoints
+DB_REPLICA_URLS = [url.strip() for url in
+                   os.environ.get('DB_REPLICA_URLS', '').split(',')
+                   if url.strip()]
+# How replicas are picked: round_robin or least_connections
+DB_REPLICA_BALANCING = os.environ.get('DB_REPLICA_BALANCING', 'round_robin')
+# Seconds after a write during which reads stay on the primary
+DB_READ_YOUR_WRITES_SECONDS = float(
+    os.environ.get('DB_READ_YOUR_WRITES_SECONDS', 5))
+# Compiled SQL statements kept in SQLAlchemy's per-engine statement cache
+DB_QUERY_CACHE_SIZE = int(os.environ.get('DB_QUERY_CACHE_SIZE', 500))
+
+# Seconds before the in-memory question id index (quiz draws, counts and
+# statistics) is reloaded from the database
+QUIZ_INDEX_TTL = int(os.environ.get('QUIZ_INDEX_TTL', 300))
+
+# Serve question reads from an in-process columnar copy of the table
+QUESTION_STORE = os.environ.get('QUESTION_STORE', 'false') == 'true'
+# Seconds between checks of the question store against the database
+QUESTION_STORE_CHECK_INTERVAL = float(
+    os.environ.get('QUESTION_STORE_CHECK_INTERVAL', 5))
+# Seconds before the question store is reloaded in full regardless
+QUESTION_STORE_TTL = int(os.environ.get('QUESTION_STORE_TTL', 300))
+
+# How workers tell each other about writes: none, file or postgres
+CHANGE_CHANNEL = os.environ.get('CHANGE_CHANNEL', 'none')
+# Version counter file shared by the workers of one host (file channel)
+CHANGE_CHANNEL_FILE = os.environ.get(
+    'CHANGE_CHANNEL_FILE',
+    os.path.join(tempfile.gettempdir(), 'trivia-changes'))
+# Seconds between checks of the change channel, 0 checks every request
+CHANGE_CHANNEL_POLL_INTERVAL = float(
+    os.environ.get('CHANGE_CHANNEL_POLL_INTERVAL', 0))
+
+# Seconds an idle quiz session is kept before it is evicted
+QUIZ_SESSION_TTL = int(os.environ.get('QUIZ_SESSION_TTL', 1800))
+
+# Seconds the in-process category lookup is kept before it is reloaded
+CATEGORY_CACHE_TTL = int(os.environ.get('CATEGORY_CACHE_TTL', 3600))
+
+# Seconds before the fallback (non-Postgres) search index is rebuilt
+SEARCH_INDEX_TTL = int(os.environ.get('SEARCH_INDEX_TTL', 300))
+
+# Rows per batch when importing or deleting questions in bulk
+BULK_BATCH_SIZE = int(os.environ.get('BULK_BATCH_SIZE', 1000))
+
+# Seconds a cached GET response (and its ETag) stays valid, 0 disables
+RESPONSE_CACHE_TTL = int(os.environ.get('RESPONSE_CACHE_TTL', 30))
+
+# JSON encoder for API responses: auto (orjson when installed), orjson, json
+JSON_PROVIDER = os.environ.get('JSON_PROVIDER', 'auto')
+
+# Per-request timing and SQL metrics (Server-Timing, logs, /api/v1/_metrics)
+INSTRUMENTATION = os.environ.get('INSTRUMENTATION', 'false') == 'true'
+# Executions of one statement in a request that are logged as an N+1 pattern
+INSTRUMENTATION_REPEATED_QUERIES = int(
+    os.environ.get('INSTRUMENTATION_REPEATED_QUERIES', 10))
+# Rows from which a SELECT without WHERE or LIMIT is logged as a full load
+INSTRUMENTATION_FULL_TABLE_ROWS = int(
+    os.environ.get('INSTRUMENTATION_FULL_TABLE_ROWS', 1000))
+
+# Requests the ASGI mode runs at once, each on a thread of its own, by
+# default one per connection the database pool can hand out
+ASGI_THREADS = int(
+    os.environ.get('ASGI_THREADS', DB_POOL_SIZE + DB_MAX_OVERFLOW))
@@ -1,12 +1,23 @@
+import asyncio
+import copy
 import os
+import tempfile
+import threading
+import time
 import unittest
 import json
+from concurrent.futures import ThreadPoolExecutor
+from types import SimpleNamespace
 from urllib import response
 from flask_sqlalchemy import SQLAlchemy
-from sqlalchemy import null
+from sqlalchemy import create_engine, null
 
 from flaskr import create_app
-from models import setup_db, Question, Category
+from flaskr.asgi import WsgiToAsgi, create_asgi_app
+from flaskr.changes import PostgresChangeChannel
+from flaskr.sessions import InMemorySessionStore
+from flaskr.store import ColumnarQuestionStore
+from models import db, setup_db, Question, Category
 
 from settings import (
     DB_USER,
@@ -150,6 +161,152 @@ class TriviaTestCase(unittest.TestCase):
         self.assertEqual(data['success'], False)
         self.assertEqual(data['message'], 'requested resource not found')
 
+    def test_200_when_retrieving_questions_after_a_given_question_id(self):
+        """
+        Test that API method returns a success
+        response with the page of questions whose ids
+        follow the given id when using keyset pagination.
+        """
+
+        # Given
+        after_id = 10
+        endpoint = '/api/v1/questions?after_id={}'.format(after_id)
+
+        # When
+        response = self.client().get(endpoint)
+        data = json.loads(response.data)
+
+        # Then
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(data['success'], True)
+        self.assertTrue(data['questions'])
+        self.assertLessEqual(len(data['questions']), 10)
+        self.assertTrue(all(q['id'] > after_id for q in data['questions']))
+        self.assertGreater(data['total_questions'], len(data['questions']))
+
+    def test_200_when_walking_questions_with_continuation_cursors(self):
+        """
+        Test that API method returns every question
+        exactly once when following the next_cursor
+        tokens from the first page to the last.
+        """
+
+        # Given
+        endpoint = '/api/v1/questions?cursor={}'
+        cursor = ''
+        seen_ids = []
+
+        # When
+        while cursor is not None:
+            response = self.client().get(endpoint.format(cursor))
+            data = json.loads(response.data)
+            self.assertEqual(response.status_code, 200)
+            seen_ids.extend(q['id'] for q in data['questions'])
+            cursor = data['next_cursor']
+
+        # Then
+        self.assertEqual(seen_ids, sorted(set(seen_ids)))
+        self.assertEqual(len(seen_ids), data['total_questions'])
+
+    def test_400_when_retrieving_questions_with_an_invalid_cursor(self):
+        """
+        Test that API method returns a 400 error
+        response when the continuation cursor
+        cannot be decoded.
+        """
+
+        # Given
+        endpoint = '/api/v1/questions?cursor=not-a-cursor'
+
+        # When
+        response = self.client().get(endpoint)
+        data = json.loads(response.data)
+
+        # Then
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(data['success'], False)
+        self.assertEqual(data['message'], 'bad request')
+
+    def test_304_when_retrieving_unchanged_questions_with_an_etag(self):
+        """
+        Test that API method returns a 304
+        response for a conditional request whose
+        ETag still matches the question listing.
+        """
+
+        # Given
+        endpoint = '/api/v1/questions?page=1'
+        etag = self.client().get(endpoint).headers['ETag']
+
+        # When
+        response = self.client().get(
+            endpoint, headers={'If-None-Match': etag})
+
+        # Then
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.data, b'')
+
+    def test_304_when_another_worker_issued_the_etag(self):
+        """
+        Test that API method returns a 304
+        response for an ETag issued by another
+        worker serving the same questions.
+        """
+
+        # Given
+        endpoint = '/api/v1/questions?page=1'
+        other_worker = create_app({
+            'DATABASE_PATH': self.app.config['SQLALCHEMY_DATABASE_URI']})
+        etag = other_worker.test_client().get(endpoint).headers['ETag']
+
+        # When
+        response = self.client().get(
+            endpoint, headers={'If-None-Match': etag})
+
+        # Then
+        self.assertEqual(response.status_code, 304)
+
+    def test_200_when_retrieving_questions_with_an_etag_after_a_write(self):
+        """
+        Test that API method returns a 200
+        response with a new ETag once a question
+        was deleted after the ETag was issued.
+        """
+
+        # Given
+        endpoint = '/api/v1/questions?page=1'
+        etag = self.client().get(endpoint).headers['ETag']
+        self.client().delete('/api/v1/questions/5')
+
+        # When
+        response = self.client().get(
+            endpoint, headers={'If-None-Match': etag})
+        data = json.loads(response.data)
+
+        # Then
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response.headers['ETag'], etag)
+        self.assertNotIn(5, [q['id'] for q in data['questions']])
+
+    def test_200_when_response_caching_is_turned_off(self):
+        """
+        Test that API method returns a 200
+        response without an ETag when the
+        response cache TTL is set to 0.
+        """
+
+        # Given
+        app = create_app({
+            'DATABASE_PATH': self.app.config['SQLALCHEMY_DATABASE_URI'],
+            'RESPONSE_CACHE_TTL': 0})
+
+        # When
+        response = app.test_client().get('/api/v1/categories')
+
+        # Then
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn('ETag', response.headers)
+
     # GET questions based on category
 
     def test_200_retrieving_questions_based_on_a_valid_given_category_id(self):
@@ -174,6 +331,33 @@ class TriviaTestCase(unittest.TestCase):
         self.assertGreater(data['total_questions'], 0)
         self.assertTrue(data['current_category'])
 
+    def test_200_questions_based_on_a_category_keep_the_question_format(
+            self):
+        """
+        Test that API method returns questions
+        based on a category with the same fields
+        and values as the question resource.
+        """
+
+        # Given
+        category_id = 6
+        endpoint = f'/api/v1/categories/{category_id}/questions'
+
+        # When
+        response = self.client().get(endpoint)
+        data = json.loads(response.data)
+
+        # Then
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(data['questions'][0], {
+            'id': 10,
+            'question': 'Which is the only team to play in every '
+                        'soccer World Cup tournament?',
+            'answer': 'Brazil',
+            'category': 6,
+            'difficulty': 3
+        })
+
     def test_404_retrieving_questions_based_on_an_invalid_given_category_id(
             self):
         """
@@ -195,6 +379,65 @@ class TriviaTestCase(unittest.TestCase):
         self.assertEqual(data['success'], False)
         self.assertTrue(data['message'], 'requested resource not found')
 
+    # GET questions export
+
+    def test_200_when_exporting_questions_of_a_category_as_csv(self):
+        """
+        Test that API method returns a 200
+        success response streaming a CSV header
+        and one line per question of the category.
+        """
+
+        # Given
+        endpoint = '/api/v1/questions/export?format=csv&category=6'
+
+        # When
+        response = self.client().get(endpoint)
+        lines = response.data.decode().splitlines()
+
+        # Then
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.mimetype, 'text/csv')
+        self.assertEqual(lines[0], 'id,question,answer,difficulty,category')
+        self.assertEqual(len(lines), 3)
+
+    def test_400_when_exporting_questions_in_an_unknown_format(self):
+        """
+        Test that API method returns a 400
+        error response when the export format
+        is not supported.
+        """
+
+        # Given
+        endpoint = '/api/v1/questions/export?format=xml'
+
+        # When
+        response = self.client().get(endpoint)
+        data = json.loads(response.data)
+
+        # Then
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(data['success'], False)
+        self.assertEqual(data['message'], 'bad request')
+
+    def test_400_when_exporting_questions_of_a_non_integer_category(self):
+        """
+        Test that API method returns a 400
+        error response instead of the whole bank
+        when the category is not an integer.
+        """
+
+        # Given
+        endpoint = '/api/v1/questions/export?category=abc'
+
+        # When
+        response = self.client().get(endpoint)
+        data = json.loads(response.data)
+
+        # Then
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(data['success'], False)
+
     # DELETE questions
 
     def test_200_when_deleting_a_question_by_given_valid_id(self):
@@ -238,6 +481,92 @@ class TriviaTestCase(unittest.TestCase):
         self.assertEqual(data['success'], False)
         self.assertEqual(data['message'], 'requested resource not found')
 
+    def test_200_when_dry_running_a_bulk_delete_by_category(self):
+        """
+        Test that API method returns a 200
+        success response listing the questions
+        a bulk delete would remove without removing them.
+        """
+
+        # Given
+        endpoint = '/api/v1/questions'
+        payload = {'category': 6, 'dry_run': True}
+
+        # When
+        response = self.client().delete(endpoint, json=payload)
+        data = json.loads(response.data)
+        remaining = self.client().get('/api/v1/categories/6/questions')
+
+        # Then
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(data['success'], True)
+        self.assertEqual(data['matched'], 2)
+        self.assertEqual(data['deleted'], 0)
+        self.assertEqual(data['ids'], [10, 11])
+        self.assertEqual(remaining.status_code, 200)
+
+    def test_200_when_deleting_questions_in_bulk_by_ids(self):
+        """
+        Test that API method returns a 200
+        success response counting only the
+        questions that existed and were deleted.
+        """
+
+        # Given
+        endpoint = '/api/v1/questions'
+        payload = {'ids': [10, 11, 404]}
+
+        # When
+        response = self.client().delete(endpoint, json=payload)
+        data = json.loads(response.data)
+
+        # Then
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(data['success'], True)
+        self.assertEqual(data['deleted'], 2)
+
+    def test_400_when_deleting_questions_in_bulk_without_a_filter(self):
+        """
+        Test that API method returns a 400
+        error response when neither ids nor a
+        filter are given for a bulk delete.
+        """
+
+        # Given
+        endpoint = '/api/v1/questions'
+
+        # When
+        response = self.client().delete(endpoint, json={'ids': []})
+        data = json.loads(response.data)
+
+        # Then
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(data['success'], False)
+        self.assertEqual(data['message'], 'bad request')
+
+    def test_400_when_deleting_questions_in_bulk_with_malformed_ids(self):
+        """
+        Test that API method returns a 400
+        error response when ids are not a list
+        of integers or come with a filter.
+        """
+
+        # Given
+        endpoint = '/api/v1/questions'
+        payloads = [{'ids': '2456'}, {'ids': [], 'category': 1},
+                    {'ids': [2, 'four']}]
+        before = self.client().get(endpoint + '?page=1').data
+
+        # When
+        responses = [self.client().delete(endpoint, json=payload)
+                     for payload in payloads]
+        after = self.client().get(endpoint + '?page=1').data
+
+        # Then
+        for response in responses:
+            self.assertEqual(response.status_code, 400)
+        self.assertEqual(after, before)
+
     # POST questions
 
     def test_200_when_creating_a_new_valid_question_resource(self):
@@ -290,92 +619,399 @@ class TriviaTestCase(unittest.TestCase):
         self.assertEqual(data['success'], False)
         self.assertEqual(data['message'], 'bad request')
 
-    # POST questions (search term)
-
-    def test_200_searching_questions_by_a_given_search_term(self):
+    def test_400_when_creating_a_new_question_in_an_unknown_category(self):
         """
-        Test that API method returns a 200
-        success response when requesting for
-        question resources based on a given search term.
+        Test that API method returns a 400
+        error response when requesting to create
+        a question in a category that does not exist.
         """
 
         # Given
-        search_term = {'searchTerm': 'title'}
         endpoint = '/api/v1/questions'
+        new_question = {
+            'question': 'What is the earths only natural satellite',
+            'answer': 'Moon',
+            'difficulty': 1,
+            'category': 404
+        }
 
         # When
-        response = self.client().post(endpoint, json=search_term)
+        response = self.client().post(endpoint, json=new_question)
         data = json.loads(response.data)
 
         # Then
-        self.assertEqual(response.status_code, 200)
-        self.assertEqual(data['success'], True)
-        self.assertTrue(data['questions'])
-        self.assertGreater(data['total_questions'], 0)
-        self.assertTrue(data['current_category'])
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(data['success'], False)
+        self.assertEqual(data['message'], 'bad request')
 
-    def test_404_searching_questions_by_a_given_search_term_that_do_not_exist(
-            self):
+    # POST questions in bulk
+
+    def test_200_when_importing_questions_in_bulk_with_invalid_rows(self):
         """
-        Test that API method returns a 404
-        error response when requesting for
-        question resources based on a given search term
-        that do not exist in the database.
+        Test that API method returns a 200
+        success response that counts the inserted
+        questions and reports every invalid row.
         """
 
         # Given
-        search_term = {'searchTerm': 'udacity'}
-        endpoint = '/api/v1/questions'
+        endpoint = '/api/v1/questions/bulk?batch_size=2'
+        questions = [
+            {
+                'question': f'Bulk imported question {number}',
+                'answer': 'Answer',
+                'difficulty': 1,
+                'category': 1
+            } for number in range(3)
+        ]
+        questions.append({'query': 'What is missing', 'solution': 'Keys'})
 
         # When
-        response = self.client().post(endpoint, json=search_term)
+        response = self.client().post(endpoint, json=questions)
         data = json.loads(response.data)
 
         # Then
-        self.assertEqual(response.status_code, 404)
-        self.assertEqual(data['success'], False)
-        self.assertEqual(data['message'], 'requested resource not found')
-
-    # ----------------------------POST Quizzes---------------------------- #
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(data['success'], True)
+        self.assertEqual(data['inserted'], 3)
+        self.assertEqual(data['failed'], 1)
+        self.assertEqual(data['errors'][0]['row'], 4)
 
-    def test_200_retrieving_new_random_question_in_all_categories(self):
+    def test_200_when_importing_ndjson_with_a_badly_encoded_line(self):
         """
-        Test that API method returns a 200
-        success response when requesting for
-        a new random question resource based on questions
-        from all categories in the database.
+        Test that API method reports a line that
+        is not valid UTF-8 as a failed row and
+        still imports the other lines.
         """
 
         # Given
-        endpoint = '/api/v1/quizzes'
-        payload = {
-            'previous_questions': [5, 4, 10, 11],
-            'quiz_category': {'type': 'click', 'id': 0}
-        }
+        endpoint = '/api/v1/questions/bulk'
+        question = json.dumps({
+            'question': 'Bulk imported NDJSON question',
+            'answer': 'Answer',
+            'difficulty': 1,
+            'category': 1
+        }).encode()
+        body = question + b'\n' + b'{"question": "\xff\xfe"}\n' + question
 
         # When
-        response = self.client().post(endpoint, json=payload)
+        response = self.client().post(
+            endpoint, data=body, content_type='application/x-ndjson')
         data = json.loads(response.data)
 
         # Then
         self.assertEqual(response.status_code, 200)
-        self.assertEqual(data['success'], True)
-        self.assertTrue(data['question'])
-        self.assertIsInstance(data['question'], dict or None)
-        self.assertNotIn(data['question']['id'], payload['previous_questions'])
+        self.assertEqual(data['inserted'], 2)
+        self.assertEqual(data['failed'], 1)
+        self.assertEqual(data['errors'][0]['row'], 2)
 
-    def test_422_retrieving_new_random_question_in_all_categories(self):
+    def test_400_when_importing_questions_in_bulk_without_a_list(self):
         """
-        Test that API method returns a 422
-        error response when requesting for a new random
-        question resource - with an unprocessable payload
-        body - based on questions from all categories in the database.
+        Test that API method returns a 400
+        error response when the bulk body is
+        not a list of questions.
         """
 
         # Given
-        endpoint = '/api/v1/quizzes'
-        payload = {
-            'previous_questions': [5, 4, 10, 11],
+        endpoint = '/api/v1/questions/bulk'
+
+        # When
+        response = self.client().post(endpoint, json={'question': 'Q'})
+        data = json.loads(response.data)
+
+        # Then
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(data['success'], False)
+        self.assertEqual(data['message'], 'bad request')
+
+    # POST questions (search term)
+
+    def test_200_searching_questions_by_a_given_search_term(self):
+        """
+        Test that API method returns a 200
+        success response when requesting for
+        question resources based on a given search term.
+        """
+
+        # Given
+        search_term = {'searchTerm': 'title'}
+        endpoint = '/api/v1/questions'
+
+        # When
+        response = self.client().post(endpoint, json=search_term)
+        data = json.loads(response.data)
+
+        # Then
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(data['success'], True)
+        self.assertTrue(data['questions'])
+        self.assertGreater(data['total_questions'], 0)
+        self.assertTrue(data['current_category'])
+
+    def test_200_searching_questions_by_stop_words_only(self):
+        """
+        Test that API method returns matching
+        questions for a search term made only
+        of common stop words.
+        """
+
+        # Given
+        search_term = {'searchTerm': 'Who'}
+        endpoint = '/api/v1/questions'
+
+        # When
+        response = self.client().post(endpoint, json=search_term)
+        data = json.loads(response.data)
+
+        # Then
+        self.assertEqual(response.status_code, 200)
+        self.assertGreater(data['total_questions'], 0)
+        for question in data['questions']:
+            self.assertIn('who', question['question'].lower())
+
+    def test_404_searching_questions_by_a_given_search_term_that_do_not_exist(
+            self):
+        """
+        Test that API method returns a 404
+        error response when requesting for
+        question resources based on a given search term
+        that do not exist in the database.
+        """
+
+        # Given
+        search_term = {'searchTerm': 'udacity'}
+        endpoint = '/api/v1/questions'
+
+        # When
+        response = self.client().post(endpoint, json=search_term)
+        data = json.loads(response.data)
+
+        # Then
+        self.assertEqual(response.status_code, 404)
+        self.assertEqual(data['success'], False)
+        self.assertEqual(data['message'], 'requested resource not found')
+
+    def test_200_searching_questions_and_answers_by_a_given_search_term(
+            self):
+        """
+        Test that API method returns a 200
+        success response with questions whose answer
+        matches the search term when searchAnswers is set.
+        """
+
+        # Given
+        search_term = {'searchTerm': 'mona', 'searchAnswers': True}
+        endpoint = '/api/v1/questions'
+
+        # When
+        response = self.client().post(endpoint, json=search_term)
+        data = json.loads(response.data)
+
+        # Then
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(data['success'], True)
+        self.assertEqual(data['total_questions'], 1)
+        self.assertEqual(data['questions'][0]['answer'], 'Mona Lisa')
+
+    # GET question suggestions
+
+    def test_200_suggesting_question_terms_for_a_given_prefix(self):
+        """
+        Test that API method returns a 200
+        success response with question words
+        that start with the given prefix.
+        """
+
+        # Given
+        endpoint = '/api/v1/questions/suggest?q=Pa'
+
+        # When
+        response = self.client().get(endpoint)
+        data = json.loads(response.data)
+
+        # Then
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(data['success'], True)
+        self.assertIn('paintings', data['suggestions'])
+        self.assertTrue(all(term.startswith('pa')
+                            for term in data['suggestions']))
+
+    def test_200_suggesting_the_most_used_terms_of_a_long_run(self):
+        """
+        Test that API method returns the most used
+        words for a prefix even when more than a
+        thousand words share it.
+        """
+
+        # Given
+        app = create_app({
+            'DATABASE_PATH': self.app.config['SQLALCHEMY_DATABASE_URI']})
+        rows = [(number, f'pa{number:04d}') for number in range(1200)]
+        rows += [(2000 + number, 'pazzle') for number in range(3)]
+        app.extensions['trivia_repository'].suggestions.rebuild(rows)
+        endpoint = '/api/v1/questions/suggest?q=Pa&limit=2'
+
+        # When
+        response = app.test_client().get(endpoint)
+        data = json.loads(response.data)
+
+        # Then
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(data['suggestions'], ['pazzle', 'pa0000'])
+
+    def test_200_suggesting_from_a_stale_index_while_it_rebuilds(self):
+        """
+        Test that API method keeps answering from
+        the old suggestions while an invalidated
+        index is rebuilt in the background.
+        """
+
+        # Given
+        app = create_app({
+            'DATABASE_PATH': self.app.config['SQLALCHEMY_DATABASE_URI']})
+        suggestions = app.extensions['trivia_repository'].suggestions
+        suggestions.rebuild([(1, 'A quixotic question')])
+        suggestions.invalidate()
+        endpoint = '/api/v1/questions/suggest?q=Qui'
+
+        # When
+        stale = json.loads(app.test_client().get(endpoint).data)
+        if suggestions.refresher is not None:
+            suggestions.refresher.join()
+        fresh = json.loads(app.test_client().get(endpoint).data)
+
+        # Then
+        self.assertEqual(stale['suggestions'], ['quixotic'])
+        self.assertNotIn('quixotic', fresh['suggestions'])
+
+    def test_400_suggesting_question_terms_without_a_prefix(self):
+        """
+        Test that API method returns a 400
+        error response when no prefix is given.
+        """
+
+        # Given
+        endpoint = '/api/v1/questions/suggest'
+
+        # When
+        response = self.client().get(endpoint)
+        data = json.loads(response.data)
+
+        # Then
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(data['success'], False)
+        self.assertEqual(data['message'], 'bad request')
+
+    # ----------------------------POST Quizzes---------------------------- #
+
+    def test_200_retrieving_new_random_question_in_all_categories(self):
+        """
+        Test that API method returns a 200
+        success response when requesting for
+        a new random question resource based on questions
+        from all categories in the database.
+        """
+
+        # Given
+        endpoint = '/api/v1/quizzes'
+        payload = {
+            'previous_questions': [5, 4, 10, 11],
+            'quiz_category': {'type': 'click', 'id': 0}
+        }
+
+        # When
+        response = self.client().post(endpoint, json=payload)
+        data = json.loads(response.data)
+
+        # Then
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(data['success'], True)
+        self.assertTrue(data['question'])
+        self.assertIsInstance(data['question'], dict or None)
+        self.assertNotIn(data['question']['id'], payload['previous_questions'])
+
+    def test_200_retrieving_new_random_question_in_a_given_category(self):
+        """
+        Test that API method returns a 200
+        success response with an unseen question
+        from the given category.
+        """
+
+        # Given
+        endpoint = '/api/v1/quizzes'
+        payload = {
+            'previous_questions': [20],
+            'quiz_category': {'type': 'Science', 'id': 1}
+        }
+
+        # When
+        response = self.client().post(endpoint, json=payload)
+        data = json.loads(response.data)
+
+        # Then
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(data['success'], True)
+        self.assertTrue(data['question'])
+        self.assertEqual(int(data['question']['category']), 1)
+        self.assertNotIn(data['question']['id'], payload['previous_questions'])
+
+    def test_200_retrieving_null_question_when_category_is_exhausted(self):
+        """
+        Test that API method returns a 200
+        success response with a null question
+        once every question in the category was played.
+        """
+
+        # Given
+        endpoint = '/api/v1/quizzes'
+        payload = {
+            'previous_questions': [10, 11],
+            'quiz_category': {'type': 'Sports', 'id': 6}
+        }
+
+        # When
+        response = self.client().post(endpoint, json=payload)
+        data = json.loads(response.data)
+
+        # Then
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(data['success'], True)
+        self.assertIsNone(data['question'])
+
+    def test_404_retrieving_new_random_question_in_an_unknown_category(self):
+        """
+        Test that API method returns a 404
+        error response when requesting for a new random
+        question in a category that does not exist.
+        """
+
+        # Given
+        endpoint = '/api/v1/quizzes'
+        payload = {
+            'previous_questions': [],
+            'quiz_category': {'type': 'Unknown', 'id': 404}
+        }
+
+        # When
+        response = self.client().post(endpoint, json=payload)
+        data = json.loads(response.data)
+
+        # Then
+        self.assertEqual(response.status_code, 404)
+        self.assertEqual(data['success'], False)
+        self.assertEqual(data['message'], 'requested resource not found')
+
+    def test_422_retrieving_new_random_question_in_all_categories(self):
+        """
+        Test that API method returns a 422
+        error response when requesting for a new random
+        question resource - with an unprocessable payload
+        body - based on questions from all categories in the database.
+        """
+
+        # Given
+        endpoint = '/api/v1/quizzes'
+        payload = {
+            'previous_questions': [5, 4, 10, 11],
         }
 
         # When
@@ -387,6 +1023,821 @@ class TriviaTestCase(unittest.TestCase):
         self.assertEqual(data['success'], False)
         self.assertTrue(data['message'], 'unprocessable entity')
 
+    def test_200_retrieving_the_easiest_question_first_with_ramp(self):
+        """
+        Test that API method returns a question
+        of the lowest difficulty to start a quiz
+        with the difficulty ramp strategy.
+        """
+
+        # Given
+        endpoint = '/api/v1/quizzes'
+        payload = {
+            'previous_questions': [],
+            'quiz_category': {'type': 'click', 'id': 0},
+            'strategy': 'ramp'
+        }
+        statistics = json.loads(self.client().get('/api/v1/stats').data)
+        easiest = min(int(level) for level in statistics['difficulties'])
+
+        # When
+        response = self.client().post(endpoint, json=payload)
+        data = json.loads(response.data)
+
+        # Then
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(data['question']['difficulty'], easiest)
+
+    def test_422_retrieving_quiz_question_with_an_infinite_weight(self):
+        """
+        Test that API method returns a 422
+        error response for a difficulty weight
+        that is not a finite number.
+        """
+
+        # Given
+        endpoint = '/api/v1/quizzes'
+        body = ('{"previous_questions": [], "strategy": "weighted",'
+                ' "quiz_category": {"type": "click", "id": 0},'
+                ' "difficulty_weights": {"1": Infinity}}')
+
+        # When
+        response = self.client().post(endpoint, data=body,
+                                      content_type='application/json')
+        data = json.loads(response.data)
+
+        # Then
+        self.assertEqual(response.status_code, 422)
+        self.assertEqual(data['success'], False)
+
+    def test_400_retrieving_quiz_question_with_unknown_strategy(self):
+        """
+        Test that API method returns a 400
+        error response for a quiz selection
+        strategy that does not exist.
+        """
+
+        # Given
+        endpoint = '/api/v1/quizzes'
+        payload = {
+            'previous_questions': [],
+            'quiz_category': {'type': 'click', 'id': 0},
+            'strategy': 'hardest_first'
+        }
+
+        # When
+        response = self.client().post(endpoint, json=payload)
+        data = json.loads(response.data)
+
+        # Then
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(data['success'], False)
+
+    def test_200_retrieving_a_batch_of_new_random_questions(self):
+        """
+        Test that API method returns the requested
+        number of distinct, unseen questions
+        in a single response.
+        """
+
+        # Given
+        endpoint = '/api/v1/quizzes'
+        payload = {
+            'previous_questions': [5, 4, 10, 11],
+            'quiz_category': {'type': 'click', 'id': 0},
+            'count': 3
+        }
+
+        # When
+        response = self.client().post(endpoint, json=payload)
+        data = json.loads(response.data)
+        question_ids = [question['id'] for question in data['questions']]
+
+        # Then
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(question_ids), 3)
+        self.assertEqual(len(set(question_ids)), 3)
+        self.assertEqual(data['question'], data['questions'][0])
+        for question_id in question_ids:
+            self.assertNotIn(question_id, payload['previous_questions'])
+
+    def test_422_retrieving_a_batch_with_an_invalid_count(self):
+        """
+        Test that API method returns a 422
+        error response for a question count
+        outside the allowed range.
+        """
+
+        # Given
+        endpoint = '/api/v1/quizzes'
+        payload = {
+            'previous_questions': [],
+            'quiz_category': {'type': 'click', 'id': 0},
+            'count': 0
+        }
+
+        # When
+        response = self.client().post(endpoint, json=payload)
+        data = json.loads(response.data)
+
+        # Then
+        self.assertEqual(response.status_code, 422)
+        self.assertEqual(data['success'], False)
+
+    # ------------------------POST Quiz Sessions------------------------- #
+
+    def test_200_playing_a_quiz_session_until_the_deck_is_exhausted(self):
+        """
+        Test that API method returns every question
+        of the category exactly once through a quiz
+        session and then returns a null question.
+        """
+
+        # Given
+        endpoint = '/api/v1/quizzes/sessions'
+        payload = {'quiz_category': {'type': 'Sports', 'id': 6}}
+
+        # When
+        response = self.client().post(endpoint, json=payload)
+        data = json.loads(response.data)
+        next_endpoint = f"{endpoint}/{data['session_id']}/next"
+        played = []
+        for _ in range(data['total_questions'] + 1):
+            played.append(json.loads(
+                self.client().post(next_endpoint).data)['question'])
+
+        # Then
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(data['success'], True)
+        self.assertEqual(data['total_questions'], 2)
+        self.assertEqual(sorted(q['id'] for q in played[:-1]), [10, 11])
+        self.assertIsNone(played[-1])
+
+    def test_404_when_playing_a_quiz_session_that_does_not_exist(self):
+        """
+        Test that API method returns a 404
+        error response when requesting the next
+        question of an unknown or expired session.
+        """
+
+        # Given
+        endpoint = '/api/v1/quizzes/sessions/unknown/next'
+
+        # When
+        response = self.client().post(endpoint)
+        data = json.loads(response.data)
+
+        # Then
+        self.assertEqual(response.status_code, 404)
+        self.assertEqual(data['success'], False)
+        self.assertEqual(data['message'], 'requested resource not found')
+
+    def test_200_playing_quiz_sessions_from_an_injected_empty_store(self):
+        """
+        Test that a quiz session store passed
+        to the app is used even while it is
+        still empty.
+        """
+
+        # Given
+        quiz_sessions = InMemorySessionStore()
+        app = create_app({
+            'DATABASE_PATH': self.app.config['SQLALCHEMY_DATABASE_URI'],
+            'QUIZ_SESSION_STORE': quiz_sessions})
+        payload = {'quiz_category': {'type': 'click', 'id': 0}}
+
+        # When
+        response = app.test_client().post('/api/v1/quizzes/sessions',
+                                          json=payload)
+        data = json.loads(response.data)
+
+        # Then
+        self.assertIs(app.extensions['trivia_repository'].quiz_sessions,
+                      quiz_sessions)
+        self.assertIsNotNone(quiz_sessions.get(data['session_id']))
+
+    def test_200_playing_one_quiz_session_from_two_requests_at_once(self):
+        """
+        Test that two concurrent requests for the
+        next question of one session never deal
+        the same question twice.
+        """
+
+        # Given
+        class SlowCopyingStore(InMemorySessionStore):
+            # Hands out copies, as stores outside the process do
+            def get(self, session_id):
+                session = super().get(session_id)
+                time.sleep(0.1)
+                return copy.deepcopy(session)
+
+        quiz_sessions = SlowCopyingStore()
+        app = create_app({
+            'DATABASE_PATH': self.app.config['SQLALCHEMY_DATABASE_URI'],
+            'QUIZ_SESSION_STORE': quiz_sessions})
+        payload = {'quiz_category': {'type': 'Sports', 'id': 6}}
+        session_id = json.loads(app.test_client().post(
+            '/api/v1/quizzes/sessions', json=payload).data)['session_id']
+        endpoint = f'/api/v1/quizzes/sessions/{session_id}/next'
+        first = json.loads(app.test_client().post(endpoint).data)
+
+        def play():
+            return json.loads(app.test_client().post(endpoint).data)
+
+        # When
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            plays = list(executor.map(lambda _: play(), range(2)))
+
+        # Then
+        self.assertEqual(first['remaining_questions'], 1)
+        self.assertEqual(sorted(quiz_sessions.get(session_id)['drawn']),
+                         [10, 11])
+        self.assertEqual(sorted(data['question'] is None for data in plays),
+                         [False, True])
+
+    # ------------------------Read Replica Routing----------------------- #
+
+    def test_200_when_reading_questions_from_a_read_replica(self):
+        """
+        Test that API method serves read-only
+        requests from a configured read replica
+        and reads from the primary right after a write.
+        """
+
+        # Given
+        replica_file, replica_name = tempfile.mkstemp(suffix='.db')
+        os.close(replica_file)
+        self.addCleanup(os.remove, replica_name)
+        replica_path = 'sqlite:///{}'.format(replica_name)
+        replica = create_engine(replica_path)
+        Question.metadata.create_all(replica)
+        with replica.begin() as connection:
+            connection.execute(Category.__table__.insert(),
+                               {'id': 1, 'type': 'Science'})
+            connection.execute(Question.__table__.insert(), {
+                'question': 'Only on the replica',
+                'answer': 'Replica',
+                'difficulty': 1,
+                'category': 1
+            })
+        replica.dispose()
+        setup_db(self.app, self.database_path, replica_paths=[replica_path])
+        endpoint = '/api/v1/questions'
+        new_question = {
+            'question': 'What is the earths only natural satellite',
+            'answer': 'Moon',
+            'difficulty': 1,
+            'category': 1
+        }
+
+        # When
+        replica_data = json.loads(self.client().get(endpoint).data)
+        self.client().post(endpoint, json=new_question)
+        primary_data = json.loads(self.client().get(endpoint).data)
+
+        # Then
+        self.assertEqual([q['question'] for q in replica_data['questions']],
+                         ['Only on the replica'])
+        self.assertNotIn('Only on the replica',
+                         [q['question'] for q in primary_data['questions']])
+
+    def test_200_playing_a_quiz_while_the_read_replica_lags_behind(self):
+        """
+        Test that API method keeps dealing questions
+        a lagging read replica does not have yet,
+        without dropping them from the quiz pool.
+        """
+
+        # Given
+        replica_file, replica_name = tempfile.mkstemp(suffix='.db')
+        os.close(replica_file)
+        self.addCleanup(os.remove, replica_name)
+        replica_path = 'sqlite:///{}'.format(replica_name)
+        replica = create_engine(replica_path)
+        Question.metadata.create_all(replica)
+        with replica.begin() as connection:
+            connection.execute(Category.__table__.insert(),
+                               {'id': 6, 'type': 'Sports'})
+        replica.dispose()
+        setup_db(self.app, self.database_path, replica_paths=[replica_path])
+        payload = {'previous_questions': [],
+                   'quiz_category': {'type': 'Sports', 'id': 6}}
+
+        # When
+        response = self.client().post('/api/v1/quizzes', json=payload)
+        data = json.loads(response.data)
+
+        # Then
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(data['question']['id'], [10, 11])
+        self.assertEqual(
+            self.app.extensions['trivia_repository'].question_ids.count(6), 2)
+
+    # ------------------------GET Statistics------------------------ #
+
+    def test_200_retrieving_question_statistics(self):
+        """
+        Test that API method returns a 200
+        success response with question counts
+        per category and per difficulty.
+        """
+
+        # Given
+        endpoint = '/api/v1/stats'
+
+        # When
+        response = self.client().get(endpoint)
+        data = json.loads(response.data)
+        listing = json.loads(self.client().get('/api/v1/questions').data)
+
+        # Then
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(data['success'], True)
+        self.assertEqual(data['total_questions'], listing['total_questions'])
+        self.assertEqual(
+            sum(category['total_questions']
+                for category in data['categories'].values()),
+            data['total_questions'])
+        self.assertEqual(sum(data['difficulties'].values()),
+                         data['total_questions'])
+
+    # ------------------------GET Pool Statistics------------------------ #
+
+    def test_200_retrieving_connection_pool_statistics(self):
+        """
+        Test that API method returns a 200
+        success response describing the
+        connection pool of an instrumented worker.
+        """
+
+        # Given
+        endpoint = '/api/v1/_pool'
+        app = create_app({'INSTRUMENTATION': True})
+        setup_db(app, self.database_path)
+
+        # When
+        response = app.test_client().get(endpoint)
+        data = json.loads(response.data)
+
+        # Then
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(data['success'], True)
+        self.assertTrue(data['pool']['status'])
+
+    def test_404_retrieving_pool_statistics_without_instrumentation(self):
+        """
+        Test that the pool statistics endpoint
+        is not served unless instrumentation
+        is on.
+        """
+
+        # Given
+        endpoint = '/api/v1/_pool'
+
+        # When
+        response = self.client().get(endpoint)
+
+        # Then
+        self.assertEqual(response.status_code, 404)
+
+    # ------------------------GET Metrics------------------------ #
+
+    def test_200_retrieving_request_metrics_with_instrumentation(self):
+        """
+        Test that instrumented requests carry
+        a Server-Timing header and show up in
+        the Prometheus metrics endpoint.
+        """
+
+        # Given
+        app = create_app({'INSTRUMENTATION': True})
+        setup_db(app, self.database_path)
+        client = app.test_client()
+
+        # When
+        listing = client.get('/api/v1/categories')
+        response = client.get('/api/v1/_metrics')
+        metrics = response.data.decode()
+
+        # Then
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('db;dur=', listing.headers['Server-Timing'])
+        self.assertIn('trivia_requests_total{endpoint="retrieve_categories",'
+                      'method="GET",status="200"} 1', metrics)
+        self.assertIn('trivia_sql_queries_total', metrics)
+
+    def test_404_retrieving_metrics_without_instrumentation(self):
+        """
+        Test that the metrics endpoint is not
+        served unless instrumentation is on.
+        """
+
+        # Given
+        endpoint = '/api/v1/_metrics'
+
+        # When
+        response = self.client().get(endpoint)
+
+        # Then
+        self.assertEqual(response.status_code, 404)
+
+    # ------------------------Repository------------------------ #
+
+    def test_repository_serves_plain_data_without_a_request(self):
+        """
+        Test that the repository behind the
+        views returns plain data inside an
+        application context alone.
+        """
+
+        # Given
+        repository = self.app.extensions['trivia_repository']
+
+        # When
+        with self.app.app_context():
+            categories = repository.categories()
+            questions = repository.question_page(page=1)
+            total_questions = repository.total_questions()
+        response = self.client().get('/api/v1/categories')
+        data = json.loads(response.data)
+
+        # Then
+        self.assertEqual(
+            {str(key): value for key, value in categories.items()},
+            data['categories'])
+        self.assertTrue(questions)
+        self.assertGreaterEqual(total_questions, len(questions))
+
+    def test_category_commits_reach_only_the_current_apps_repository(self):
+        """
+        Test that a category change committed in
+        one app refreshes that app's repository
+        once, however many apps were created.
+        """
+
+        # Given
+        apps = [create_app({
+            'DATABASE_PATH': self.app.config['SQLALCHEMY_DATABASE_URI']})
+            for _ in range(3)]
+        notified = []
+        for number, app in enumerate(apps):
+            app.extensions['trivia_repository'].subscribe(
+                lambda number=number: notified.append(number))
+        repository = apps[0].extensions['trivia_repository']
+
+        # When
+        with apps[0].app_context():
+            repository.categories()
+            category = Category(type='Repository test category')
+            repository.session.add(category)
+            repository.session.commit()
+            categories = repository.categories()
+            repository.session.delete(category)
+            repository.session.commit()
+
+        # Then
+        self.assertEqual(notified, [0, 0])
+        self.assertIn('Repository test category', categories.values())
+
+    # ------------------------Question Store------------------------ #
+
+    def test_200_question_store_serves_identical_responses(self):
+        """
+        Test that an app serving reads from
+        the in-memory question store returns
+        the same listings as the database.
+        """
+
+        # Given
+        store_app = create_app({
+            'DATABASE_PATH': self.app.config['SQLALCHEMY_DATABASE_URI'],
+            'QUESTION_STORE': True})
+        endpoints = ['/api/v1/questions?page=1', '/api/v1/questions?page=2',
+                     '/api/v1/questions?cursor=',
+                     '/api/v1/categories/1/questions']
+
+        # When
+        responses = [(self.client().get(endpoint),
+                      store_app.test_client().get(endpoint))
+                     for endpoint in endpoints]
+
+        # Then
+        for from_database, from_store in responses:
+            self.assertEqual(from_store.status_code, from_database.status_code)
+            self.assertEqual(from_store.data, from_database.data)
+
+    def test_200_question_store_writes_through_create_and_delete(self):
+        """
+        Test that questions created and deleted
+        through the API are reflected by the
+        in-memory question store right away.
+        """
+
+        # Given
+        store_app = create_app({
+            'DATABASE_PATH': self.app.config['SQLALCHEMY_DATABASE_URI'],
+            'QUESTION_STORE': True})
+        client = store_app.test_client()
+        payload = {
+            'question': 'Which store keeps questions in columns?',
+            'answer': 'The columnar one',
+            'difficulty': 1,
+            'category': 1
+        }
+        search = {'searchTerm': 'store keeps questions'}
+
+        # When
+        client.post('/api/v1/questions', json=payload)
+        created = json.loads(
+            client.post('/api/v1/questions', json=search).data)
+        question_id = created['questions'][0]['id']
+        client.delete(f'/api/v1/questions/{question_id}')
+        response = client.post('/api/v1/questions', json=search)
+
+        # Then
+        self.assertEqual(created['total_questions'], 1)
+        self.assertEqual(created['questions'][0]['answer'], payload['answer'])
+        self.assertEqual(response.status_code, 404)
+
+    def test_question_store_reloads_in_place_changes_after_its_ttl(self):
+        """
+        Test that the question store picks up a
+        change its (count, max id) check cannot
+        see once its TTL has passed.
+        """
+
+        # Given
+        rows = [(1, 'Question', 'Answer', 1, 1),
+                (2, 'Question', 'Answer', 1, 2)]
+        store = ColumnarQuestionStore(
+            lambda: list(rows), lambda: (len(rows), rows[-1][0]),
+            check_interval=0, ttl=0)
+        store.build()
+
+        # When
+        rows[0] = (1, 'Question', 'Answer', None, 1)
+        category_questions = store.page(category=1)
+
+        # Then
+        self.assertEqual([row.id for row in category_questions], [2])
+
+    # ------------------------Change Notification------------------------ #
+
+    def test_200_workers_apply_each_others_writes_through_a_channel(self):
+        """
+        Test that a write handled by one app
+        is seen by the cached reads of another
+        app sharing the same change channel.
+        """
+
+        # Given
+        handle, channel_file = tempfile.mkstemp()
+        os.close(handle)
+        self.addCleanup(os.remove, channel_file)
+        config = {
+            'DATABASE_PATH': self.app.config['SQLALCHEMY_DATABASE_URI'],
+            'QUESTION_STORE': True,
+            'CHANGE_CHANNEL': 'file',
+            'CHANGE_CHANNEL_FILE': channel_file
+        }
+        writer = create_app(config).test_client()
+        reader = create_app(config).test_client()
+        endpoint = '/api/v1/categories/1/questions'
+        payload = {
+            'question': 'Which worker wrote this question?',
+            'answer': 'The other one',
+            'difficulty': 1,
+            'category': 1
+        }
+
+        # When
+        before = json.loads(reader.get(endpoint).data)
+        writer.post('/api/v1/questions', json=payload)
+        after_create = json.loads(reader.get(endpoint).data)
+        created = [question for question in after_create['questions']
+                   if question['question'] == payload['question']]
+        writer.delete(f'/api/v1/questions/{created[0]["id"]}')
+        after_delete = json.loads(reader.get(endpoint).data)
+
+        # Then
+        self.assertEqual(len(created), 1)
+        self.assertEqual(after_create['total_questions'],
+                         before['total_questions'] + 1)
+        self.assertEqual(after_delete['questions'], before['questions'])
+
+    def test_200_writes_succeed_when_the_change_channel_fails(self):
+        """
+        Test that a committed write still returns
+        a 200 success response when it cannot be
+        published to the change channel.
+        """
+
+        # Given
+        app = create_app({
+            'DATABASE_PATH': self.app.config['SQLALCHEMY_DATABASE_URI'],
+            'CHANGE_CHANNEL': 'file',
+            'CHANGE_CHANNEL_FILE': os.path.join(
+                tempfile.gettempdir(), 'missing-directory', 'trivia-changes')
+        })
+        payload = {
+            'question': 'Does a broken channel fail the write?',
+            'answer': 'No',
+            'difficulty': 1,
+            'category': 1
+        }
+
+        # When
+        response = app.test_client().post('/api/v1/questions', json=payload)
+        data = json.loads(response.data)
+
+        # Then
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(data['success'], True)
+
+    def test_polling_skips_malformed_change_notifications(self):
+        """
+        Test that polling the Postgres change
+        channel skips notifications it cannot
+        parse and returns the well-formed ones.
+        """
+
+        # Given
+        readable, writable = os.pipe()
+        self.addCleanup(os.close, readable)
+        self.addCleanup(os.close, writable)
+        channel = PostgresChangeChannel(engine=None)
+        origin = channel.own_origin()
+        payloads = ['not json', 'null', '["other", "question_deleted"]',
+                    '["other", "question_deleted", "5"]',
+                    json.dumps([origin, 'question_deleted', 4]),
+                    '["other", "question_deleted", 5]']
+
+        class Listener:
+            notifies = [SimpleNamespace(payload=payload)
+                        for payload in payloads]
+
+            def fileno(self):
+                return readable
+
+        channel.listener = Listener()
+
+        # When
+        events = channel.poll()
+
+        # Then
+        self.assertEqual(events, [('question_deleted', 5)])
+        self.assertIsNotNone(channel.listener)
+
+    def test_polling_changes_published_by_another_postgres_worker(self):
+        """
+        Test that a change published on the
+        Postgres change channel reaches the
+        channel of another worker.
+        """
+
+        # Given
+        with self.app.app_context():
+            engine = db.engine
+        if engine.dialect.name != 'postgresql':
+            self.skipTest('needs a Postgres database')
+        publisher = PostgresChangeChannel(engine)
+        listener = PostgresChangeChannel(engine)
+        listener.poll()
+        self.addCleanup(listener.drop_listener)
+
+        # When
+        publisher.publish('question_deleted', 5)
+        events, deadline = [], time.monotonic() + 5
+        while not events and time.monotonic() < deadline:
+            time.sleep(0.05)
+            events = listener.poll()
+
+        # Then
+        self.assertEqual(events, [('question_deleted', 5)])
+
+    # ------------------------ASGI Mode------------------------ #
+
+    def test_200_asgi_mode_serves_identical_responses(self):
+        """
+        Test that the ASGI app returns the same
+        statuses and bodies as the Flask app
+        for the same requests.
+        """
+
+        # Given
+        if WsgiToAsgi is None:
+            self.skipTest('asgiref is not installed')
+        asgi_app = create_asgi_app({
+            'DATABASE_PATH': self.app.config['SQLALCHEMY_DATABASE_URI']})
+        endpoints = ['/api/v1/categories', '/api/v1/questions?page=2',
+                     '/api/v1/categories/1/questions',
+                     '/api/v1/stats', '/api/v1/questions/export',
+                     '/api/v1/missing']
+
+        # When
+        asgi_responses = [asgi_request(asgi_app, 'GET', path)[:2]
+                          for path in endpoints]
+        flask_responses = [self.client().get(path) for path in endpoints]
+
+        # Then
+        self.assertEqual(
+            asgi_responses,
+            [(response.status_code, response.data)
+             for response in flask_responses])
+
+    def test_200_asgi_mode_writes_through_the_repository(self):
+        """
+        Test that questions created and deleted
+        through the ASGI app go through the
+        repository, which tells its listeners.
+        """
+
+        # Given
+        if WsgiToAsgi is None:
+            self.skipTest('asgiref is not installed')
+        asgi_app = create_asgi_app({
+            'DATABASE_PATH': self.app.config['SQLALCHEMY_DATABASE_URI']})
+        changes = []
+        asgi_app.app.extensions['trivia_repository'].subscribe(
+            lambda: changes.append(True))
+        payload = json.dumps({
+            'question': 'Which adapter served this question?',
+            'answer': 'ASGI',
+            'difficulty': 1,
+            'category': 1
+        }).encode()
+        search = json.dumps({'searchTerm': 'adapter served'}).encode()
+        headers = [(b'content-type', b'application/json')]
+
+        # When
+        status, _, _ = asgi_request(asgi_app, 'POST', '/api/v1/questions',
+                                    payload, headers)
+        _, body, _ = asgi_request(asgi_app, 'POST', '/api/v1/questions',
+                                  search, headers)
+        created = json.loads(body)['questions'][0]['id']
+        deleted, _, _ = asgi_request(asgi_app, 'DELETE',
+                                     f'/api/v1/questions/{created}')
+
+        # Then
+        self.assertEqual(status, 200)
+        self.assertEqual(deleted, 200)
+        self.assertEqual(len(changes), 2)
+
+    def test_200_asgi_mode_runs_requests_concurrently(self):
+        """
+        Test that the ASGI app runs requests on
+        threads of their own instead of one
+        shared thread.
+        """
+
+        # Given
+        if WsgiToAsgi is None:
+            self.skipTest('asgiref is not installed')
+        asgi_app = create_asgi_app({
+            'DATABASE_PATH': self.app.config['SQLALCHEMY_DATABASE_URI']})
+        both_running = threading.Barrier(2, timeout=5)
+
+        @asgi_app.app.route('/api/v1/_rendezvous')
+        def rendezvous():
+            both_running.wait()
+            return 'met'
+
+        async def get_both():
+            return await asyncio.gather(*[
+                asgi_call(asgi_app, 'GET', '/api/v1/_rendezvous')
+                for _ in range(2)])
+
+        # When
+        responses = asyncio.run(get_both())
+
+        # Then
+        self.assertEqual([status for status, _, _ in responses], [200, 200])
+
+
+def asgi_request(asgi_app, method, target, body=b'', headers=()):
+    # One request through an ASGI app: status, body and headers
+    return asyncio.run(asgi_call(asgi_app, method, target, body, headers))
+
+
+async def asgi_call(asgi_app, method, target, body=b'', headers=()):
+    path, _, query = target.partition('?')
+    scope = {'type': 'http', 'http_version': '1.1', 'method': method,
+             'path': path, 'query_string': query.encode(),
+             'headers': [(b'content-length', str(len(body)).encode()),
+                         *headers]}
+    sent = []
+
+    async def receive():
+        return {'type': 'http.request', 'body': body}
+
+    async def send(message):
+        sent.append(message)
+
+    await asgi_app(scope, receive, send)
+    return (sent[0]['status'],
+            b''.join(message.get('body', b'') for message in sent[1:]),
+            dict(sent[0]['headers']))
+
 
 # Make the tests conveniently executable
 if __name__ == "__main__":